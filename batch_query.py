@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# batch_query.py
+"""Run a JSONL question set through POST /query/batch and save the results.
+
+Each input line is {"question": ..., "id": optional, "sources": optional}.
+Results are written to --output as JSONL in completion order, with a
+summary line at the end. The job id defaults to a hash of the input file,
+so rerunning the same file after an interruption replays the answers the
+server already journaled and only asks the remaining questions.
+
+    python batch_query.py questions.jsonl --output answers.jsonl
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--output", help="results file (default: <input>.results.jsonl)")
+    parser.add_argument("--job-id", help="resume key (default: derived from the input contents)")
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    body = input_path.read_bytes()
+    job_id = args.job_id or f"{input_path.stem[:40]}-{hashlib.sha256(body).hexdigest()[:16]}"
+    output_path = Path(args.output or input_path.with_suffix(".results.jsonl"))
+
+    start = time.perf_counter()
+    response = requests.post(
+        f"{args.url}/query/batch",
+        params={"job_id": job_id},
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+        stream=True,
+        timeout=(10, None)
+    )
+    if response.status_code != 200:
+        sys.exit(f"Batch rejected ({response.status_code}): {response.text}")
+
+    summary = None
+    with open(output_path, 'w') as out:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            out.write(line + "\n")
+            out.flush()
+            record = json.loads(line)
+            if record["type"] == "error":
+                sys.exit(f"Batch failed: {record['detail']} (rerun to resume job {job_id})")
+            if record["type"] == "summary":
+                summary = record
+            elif "progress" in record:
+                progress = record["progress"]
+                status = "FAILED" if record.get("error") else ("cached" if record.get("cached") else "ok")
+                print(f"[{progress['done']}/{progress['total']}] {status:6} {record['id']}  "
+                      f"{progress['questions_per_minute']:.1f} questions/min", file=sys.stderr)
+
+    if summary is None:
+        sys.exit(f"Connection closed before the batch finished; rerun to resume job {job_id}")
+    print(f"{summary['questions']} questions: {summary['answered']} answered, {summary['failed']} failed, "
+          f"{summary['resumed']} resumed in {time.perf_counter() - start:.1f} s "
+          f"({summary['questions_per_minute']:.1f} questions/min) -> {output_path}")
+    if summary["failed"]:
+        print(f"Rerun the same command to retry the failed questions (job {job_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_chunking.py
+"""Peak RSS and time-to-first-embedded-batch for the chunking pipeline.
+
+Generates a synthetic corpus (default: 400 sources x 300 KB, roughly 100x
+the four current guidelines) and feeds it through DataProcessor into a stub
+embedder. "streaming" consumes process_documents() as a generator; "eager"
+materializes every batch first, as the old implementation did. Each mode
+runs in its own subprocess so peak RSS figures don't contaminate each other.
+
+    python -m benchmarks.bench_chunking --sources 400 --source-kb 300
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_embeddings import WORDS
+from benchmarks.stubs import StubEmbeddings
+from components.data_processor import DataProcessor
+from components.embedding_scheduler import EmbeddingScheduler
+
+
+class SyntheticProcessor(DataProcessor):
+    """DataProcessor whose sources are generated locally instead of downloaded"""
+
+    def __init__(self, sources, source_kb, cache_dir):
+        urls = [f"synthetic://American-College-of-Gastroenterology-{i}" for i in range(sources)]
+        super().__init__(urls=urls, cache_dir=cache_dir)
+        self.source_kb = source_kb
+
+    def fetch_url(self, url):
+        rng = random.Random(url)
+        paragraphs = []
+        size = 0
+        while size < self.source_kb * 1024:
+            paragraph = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 160)))
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        return "\n\n".join(paragraphs)
+
+
+def run_mode(mode, sources, source_kb):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        processor = SyntheticProcessor(sources, source_kb, cache_dir)
+        stub = StubEmbeddings(dimension=256, latency=0.05, per_input_latency=0.0)
+        scheduler = EmbeddingScheduler(lambda texts: (stub.embed_documents(texts), {}),
+                                       max_batch_inputs=250)
+        first_batch = {}
+        start = time.perf_counter()
+
+        def on_batch(documents, vectors):
+            first_batch.setdefault("s", time.perf_counter() - start)
+
+        batches = processor.process_documents()
+        if mode == "eager":
+            batches = list(batches)
+        documents = (doc for batch in batches for doc in batch)
+        embedded = scheduler.run(documents, on_batch)
+        total = time.perf_counter() - start
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "mode": mode,
+        "chunks": embedded,
+        "time_to_first_embedded_batch_s": first_batch.get("s"),
+        "total_s": total,
+        "peak_rss_mb": usage / 1024,
+        "peak_child_rss_mb": children / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=400)
+    parser.add_argument("--source-kb", type=int, default=300)
+    parser.add_argument("--mode", choices=["streaming", "eager"])
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.sources, args.source_kb)))
+        return
+
+    results = []
+    for mode in ("streaming", "eager"):
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_chunking", "--mode", mode,
+             "--sources", str(args.sources), "--source-kb", str(args.source_kb)],
+            capture_output=True, text=True, check=True
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{mode}: {result['chunks']} chunks, first embedded batch after "
+              f"{result['time_to_first_embedded_batch_s']:.2f}s, total {result['total_s']:.2f}s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_coalescing.py
+"""Burst of N identical concurrent questions through RAGChain.
+
+Builds a small synthetic index with the stub embedder and drives
+RAGChain.aquery / astream_query with a stub chat model that streams tokens
+at a fixed rate. With coalescing, each burst must cause exactly one upstream
+LLM call (rag_chain.llm_calls == 1) while every client receives the full
+answer: for blocking requests, for streamed requests with staggered arrivals
+(late subscribers replay earlier tokens), and for a mix of the two.
+
+    python -m benchmarks.bench_coalescing --clients 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.run_benchmarks import synthetic_batches
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+
+
+async def ask(rag_chain, question):
+    return (await rag_chain.aquery(question))["answer"]
+
+
+async def ask_streaming(rag_chain, question, delay):
+    await asyncio.sleep(delay)
+    tokens = []
+    async for event in rag_chain.astream_query(question):
+        if event["type"] == "token":
+            tokens.append(event["content"])
+    return "".join(tokens)
+
+
+async def burst(rag_chain, name, clients):
+    """One burst of identical questions; returns True if it cost exactly one LLM call"""
+    # Same question with different casing and spacing still coalesces
+    question = f"How is seronegative coeliac disease diagnosed ({name})"
+    variants = [f"  {question.upper()}? " if i % 2 else question for i in range(clients)]
+    token_delay = 1 / rag_chain.llm.tokens_per_second
+    requests = []
+    for i, variant in enumerate(variants):
+        if name == "run" or (name == "mixed" and i % 2 == 0):
+            requests.append(ask(rag_chain, variant))
+        else:
+            # Stagger arrivals so late subscribers have to replay earlier tokens
+            requests.append(ask_streaming(rag_chain, variant, token_delay * (i % 20)))
+
+    rag_chain.llm_calls = 0
+    rag_chain.llm.calls = 0
+    start = time.perf_counter()
+    answers = await asyncio.gather(*requests)
+    elapsed = time.perf_counter() - start
+
+    complete = bool(answers[0]) and all(answer == answers[0] for answer in answers)
+    ok = rag_chain.llm_calls == 1 and rag_chain.llm.calls == 1 and complete
+    print(f"{'PASS' if ok else 'FAIL'}  {name}: {clients} requests -> {rag_chain.llm_calls} LLM call(s) "
+          f"({rag_chain.llm.calls} upstream), identical complete answers: {complete}, {elapsed:.2f}s")
+    return ok
+
+
+async def main_async(args):
+    from components.rag_chain import RAGChain
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rag_chain = RAGChain(
+            llm=StubChatModel(ttft=args.llm_ttft, tokens_per_second=args.llm_tps, answer_tokens=200),
+            embedding_function=StubEmbeddings(dimension=args.dimension, latency=0.01, per_input_latency=0),
+            persist_directory=str(Path(workdir) / "chroma_db")
+        )
+        rag_chain.initialize(synthetic_batches(args.chunks))
+        results = [await burst(rag_chain, name, args.clients) for name in ("run", "stream", "mixed")]
+        print(f"stats: {rag_chain.single_flight.stats()}")
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--llm-ttft", type=float, default=0.2)
+    parser.add_argument("--llm-tps", type=float, default=200.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENROUTER_API_KEY", "offline-benchmark")
+    # The answer cache would serve later bursts without reaching the coalescing path
+    os.environ["RAG_ANSWER_CACHE"] = "0"
+    os.environ["RAG_TIMING_LOG"] = ""
+    ok = asyncio.run(main_async(args))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
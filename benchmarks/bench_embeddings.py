@@ -0,0 +1,96 @@
+# benchmarks/bench_embeddings.py
+"""Compare ingest and query embedding cost: OpenAI-like stub vs local model, cold vs cached.
+
+    python -m benchmarks.bench_embeddings --chunks 2000 --queries 50
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stubs import StubEmbeddings
+from components.embeddings import CachedEmbeddings
+
+WORDS = ("coeliac gluten serology tTG-IgA biopsy Marsh villous atrophy duodenal HLA-DQ2 DQ8 "
+         "dermatitis herpetiformis refractory diet adherence follow-up dietitian iron folate "
+         "osteoporosis vaccination lymphoma enteropathy antibodies endomysial deamidated").split()
+
+
+def synthetic_chunks(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(180)) for _ in range(count)]
+
+
+def time_ingest(embeddings, chunks, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        embeddings.embed_documents(chunks[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def time_queries(embeddings, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def bench_backend(name, embeddings, chunks, queries, batch_size, cache_dir):
+    result = {"backend": name}
+    result["ingest_cold_s"] = time_ingest(embeddings, chunks, batch_size)
+    result["query_cold"] = time_queries(embeddings, queries)
+
+    cached = CachedEmbeddings(embeddings, Path(cache_dir) / f"{name}.sqlite3")
+    result["ingest_cache_fill_s"] = time_ingest(cached, chunks, batch_size)
+    result["ingest_cached_s"] = time_ingest(cached, chunks, batch_size)
+    time_queries(cached, queries)
+    result["query_cached"] = time_queries(cached, queries)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--stub-latency", type=float, default=0.25, help="seconds per stub request")
+    parser.add_argument("--local-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+    queries = [f"question {i}: " + " ".join(random.Random(i).sample(WORDS, 8)) for i in range(args.queries)]
+    results = []
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        stub = StubEmbeddings(latency=args.stub_latency)
+        results.append(bench_backend("openai-stub", stub, chunks, queries, args.batch_size, cache_dir))
+
+        try:
+            from components.embeddings import LocalEmbeddings
+            local = LocalEmbeddings(args.local_model)
+        except ImportError as e:
+            print(f"Skipping local backend: {str(e)}")
+        else:
+            results.append(bench_backend("local", local, chunks, queries, args.batch_size, cache_dir))
+
+    for result in results:
+        print(f"{result['backend']}: ingest cold {result['ingest_cold_s']:.2f}s, "
+              f"cached {result['ingest_cached_s']:.2f}s; "
+              f"query p50 cold {result['query_cold']['p50_ms']:.1f} ms, "
+              f"cached {result['query_cached']['p50_ms']:.1f} ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
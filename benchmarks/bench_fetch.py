@@ -0,0 +1,93 @@
+# benchmarks/bench_fetch.py
+"""Exercise DataProcessor fetching against a local HTTP stand-in for Dropbox.
+
+The stand-in serves one file per guideline with a fixed per-request delay and
+honours If-None-Match, so the run shows both the parallel cold fetch and the
+304-only revalidation pass.
+
+    python -m benchmarks.bench_fetch --delay 0.5
+"""
+import argparse
+import hashlib
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from components.data_processor import DataProcessor
+
+FILES = {
+    "/American-College-of-Gastroenterology.md": "ACG guideline text. " * 2000,
+    "/British-Society-of-Gastroenterology.md": "BSG guideline text. " * 2000,
+    "/European-Society-for-the-Study-of-Coeliac-Disease.md": "ESsCD guideline text. " * 2000,
+    "/medication_warnings.txt": "MED-FDA warnings. " * 2000,
+}
+# Ingested markers are per collection: a second embedding model's collection still needs every chunk
+COLLECTION = "hepatology_docs"
+OTHER_COLLECTION = "hepatology_docs_sentence_transformers_all_MiniLM_L6_v2"
+
+
+def make_handler(delay, counters):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = FILES.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                counters["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            counters["200"] += 1
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds per request")
+    args = parser.parse_args()
+
+    counters = {"200": 0, "304": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.delay, counters))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [base + path for path in FILES]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("cold", "revalidate"):
+            processor = DataProcessor(urls=urls, cache_dir=cache_dir)
+            start = time.perf_counter()
+            contents = processor.fetch_all()
+            elapsed = time.perf_counter() - start
+            ok = sum(content is not None for content in contents.values())
+            print(f"{label}: {ok}/{len(urls)} sources in {elapsed:.2f}s "
+                  f"(serial would be ~{args.delay * len(urls):.2f}s), responses so far {counters}")
+            # Stand in for a completed index sync of every fetched source
+            processor.processed_urls.update(url for url, content in contents.items() if content)
+            processor.mark_ingested(COLLECTION)
+
+        for collection in (COLLECTION, OTHER_COLLECTION):
+            processor = DataProcessor(urls=urls, cache_dir=cache_dir)
+            batches = list(processor.process_documents(only_changed_in=collection))
+            print(f"only_changed pass for {collection} after ingesting {COLLECTION}: "
+                  f"{sum(len(b) for b in batches)} chunks to embed")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
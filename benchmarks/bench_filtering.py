@@ -0,0 +1,143 @@
+# benchmarks/bench_filtering.py
+"""Latency and relevance of source-filtered vs unfiltered retrieval.
+
+Runs against the existing ./chroma_db. Every question from
+retrieval_questions.jsonl is asked once per guideline ("... according to
+the BSG guideline") through the unfiltered path, the boosted path (what a
+guideline name in the question triggers: an extra sub-retrieval on that
+guideline fused into the ranking) and the filtered path (an explicit
+`sources` list: Chroma `where` pushdown plus BM25 source filter). Reported per path:
+latency, source precision (share of returned chunks from the named
+guideline) and recall@k of chunks from that guideline containing the
+expected phrases. Medication questions also report how many MED-FDA chunks
+reach the context with and without the parallel MED-FDA sub-retrieval.
+
+Before touching the index, a fixed set of questions checks which ones
+trigger the MED-FDA lookup; the run exits 1 if any is misclassified.
+
+    python -m benchmarks.bench_filtering --k 10
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from benchmarks.bench_retrieval import QUESTIONS_PATH, is_relevant, load_questions
+from components.rag_chain import RAGChain
+from components.source_filter import MEDICATION_SOURCE, SOURCES, mentions_medication
+
+# (question, should trigger the MED-FDA lookup)
+MEDICATION_CASES = [
+    ("Is dapsone safe for dermatitis herpetiformis in pregnancy?", True),
+    ("When is cyclosporine used in refractory coeliac disease?", True),
+    ("What is the role of cladribine in type 2 refractory coeliac disease?", True),
+    ("Does budesonide help refractory coeliac disease?", True),
+    ("Can azathioprine be combined with prednisolone?", True),
+    ("Which antibody titres fall first on a gluten-free diet?", False),
+    ("Is an FDA-approved gluten-free label reliable?", False),
+    ("What did the April magazine say about oats?", False),
+]
+
+
+def summarize(name, latencies, precisions, recalls, k):
+    latencies = sorted(latencies)
+    return {
+        "path": name,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        "source_precision": sum(precisions) / len(precisions),
+        f"recall@{k}": sum(recalls) / len(recalls) if recalls else 0.0,
+    }
+
+
+def timed_retrieve(rag_chain, question, plan):
+    start = time.perf_counter()
+    documents, _ = rag_chain.retrieve(question, plan=plan)
+    return documents, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--questions", default=str(QUESTIONS_PATH))
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    misclassified = [(q, expected) for q, expected in MEDICATION_CASES if mentions_medication(q) != expected]
+    print(f"{'PASS' if not misclassified else 'FAIL'}  medication classification: {json.dumps(misclassified)}")
+
+    questions = load_questions(args.questions)
+    rag_chain = RAGChain()
+    rag_chain.initialize(None)
+
+    corpus = rag_chain.db.get(include=["documents", "metadatas"])
+    corpus = list(zip(corpus["documents"], corpus["metadatas"]))
+
+    paths = {"unfiltered": ([], [], []), "boosted": ([], [], []), "filtered": ([], [], [])}
+    for item in questions:
+        for source in SOURCES:
+            question = f"{item['question']} according to the {source} guideline"
+            relevant_total = sum(
+                metadata.get("source") == source and is_relevant(text, item["expected"])
+                for text, metadata in corpus
+            )
+            plans = {
+                "unfiltered": None,
+                "boosted": {"sources": [], "boost_sources": [source], "auto_detected": True,
+                            "medication_check": False},
+                "filtered": {"sources": [source], "boost_sources": [], "auto_detected": False,
+                             "medication_check": False},
+            }
+            for name, plan in plans.items():
+                documents, latency = timed_retrieve(rag_chain, question, plan)
+                documents = documents[:args.k]
+                latencies, precisions, recalls = paths[name]
+                latencies.append(latency)
+                from_source = [doc for doc in documents if doc.metadata.get("source") == source]
+                precisions.append(len(from_source) / len(documents) if documents else 0.0)
+                if relevant_total:
+                    hits = sum(is_relevant(doc.page_content, item["expected"]) for doc in from_source)
+                    recalls.append(hits / min(relevant_total, args.k))
+
+    results = {
+        "medication_classification": {"passed": not misclassified, "misclassified": misclassified},
+        "source_filter": [summarize(name, *values, args.k) for name, values in paths.items()],
+    }
+
+    medication = {"without_lookup": ([], []), "with_lookup": ([], [])}
+    for item in questions:
+        if not mentions_medication(item["question"]):
+            continue
+        for name, check in (("without_lookup", False), ("with_lookup", True)):
+            plan = {"sources": [], "boost_sources": [], "auto_detected": False, "medication_check": check}
+            documents, latency = timed_retrieve(rag_chain, item["question"], plan)
+            latencies, counts = medication[name]
+            latencies.append(latency)
+            counts.append(sum(doc.metadata.get("source") == MEDICATION_SOURCE for doc in documents))
+    if medication["with_lookup"][0]:
+        results["medication_lookup"] = [
+            {
+                "path": name,
+                "questions": len(latencies),
+                "p50_ms": sorted(latencies)[len(latencies) // 2],
+                "med_fda_chunks": sum(counts) / len(counts),
+            }
+            for name, (latencies, counts) in medication.items()
+        ]
+
+    for result in results["source_filter"]:
+        print(f"{result['path']}: p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+              f"source precision {result['source_precision']:.2f}, "
+              f"recall@{args.k} {result[f'recall@{args.k}']:.3f}")
+    for result in results.get("medication_lookup", []):
+        print(f"medication {result['path']}: p50 {result['p50_ms']:.1f} ms, "
+              f"{result['med_fda_chunks']:.1f} MED-FDA chunks per question")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if misclassified:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_retrieval.py
+"""Recall@k and latency of MMR-only vs hybrid (MMR + BM25 with RRF) retrieval.
+
+Runs against the existing ./chroma_db; a chunk counts as relevant to a
+question when it contains every expected phrase from retrieval_questions.jsonl.
+
+    python -m benchmarks.bench_retrieval --k 10
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from components.rag_chain import RAGChain
+
+QUESTIONS_PATH = Path(__file__).with_name("retrieval_questions.jsonl")
+
+
+def load_questions(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_relevant(text, expected):
+    text = text.lower()
+    return all(phrase.lower() in text for phrase in expected)
+
+
+def evaluate(name, retrieve, questions, relevant_counts, k):
+    recalls, latencies = [], []
+    for item, relevant_total in zip(questions, relevant_counts):
+        start = time.perf_counter()
+        documents = retrieve(item["question"])[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        if relevant_total:
+            hits = sum(is_relevant(doc.page_content, item["expected"]) for doc in documents)
+            recalls.append(hits / min(relevant_total, k))
+    latencies.sort()
+    return {
+        "retriever": name,
+        f"recall@{k}": sum(recalls) / len(recalls) if recalls else 0.0,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--questions", default=str(QUESTIONS_PATH))
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    rag_chain = RAGChain()
+    rag_chain.initialize(None)
+
+    corpus = rag_chain.db.get(include=["documents"])["documents"]
+    relevant_counts = [
+        sum(is_relevant(text, item["expected"]) for text in corpus) for item in questions
+    ]
+
+    mmr = rag_chain.db.as_retriever(search_type="mmr", search_kwargs=rag_chain.search_kwargs)
+    results = [evaluate("mmr", mmr.invoke, questions, relevant_counts, args.k)]
+    if rag_chain.bm25_index is not None:
+        results.append(evaluate(
+            "hybrid", lambda q: rag_chain.retrieve(q)[0], questions, relevant_counts, args.k
+        ))
+
+    for result in results:
+        print(f"{result['retriever']}: recall@{args.k} {result[f'recall@{args.k}']:.3f}, "
+              f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
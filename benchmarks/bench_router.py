@@ -0,0 +1,217 @@
+# benchmarks/bench_router.py
+"""Model routing, hedging and circuit breaking against local stub LLM servers.
+
+Starts one stub OpenAI-compatible server per route (benchmarks.stub_server)
+with injected latency and failures, points ChatOpenAI clients at them and
+runs the router through each scenario:
+
+- classification: lookups go to the fast model, synthesis questions to the reasoning model
+- fallback only: with no fast model configured, short lookups still go to the
+  reasoning model and the fallback answers only when it is down
+- hedging: the primary hangs, the fallback is started after the deadline and wins
+- failover: the primary returns 503s, the fallback is tried at once (no deadline wait)
+- circuit breaker: after repeated failures the primary receives no more requests,
+  then a single half-open trial reaches it once the reset timeout passes
+- half-open hedge: a hedge into a half-open route that loses the race frees
+  its trial slot, so the route is still tried on the next request
+- exhaustion: every route fails and the error reaches the caller
+
+Answer tokens carry the stub's --name prefix, so the winning route is
+visible in the output. Exits 1 if any scenario fails.
+
+    python -m benchmarks.bench_router --hedge-after 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import requests
+from langchain_core.messages import HumanMessage
+
+from benchmarks.stub_server import serve
+from components.model_router import ModelRouter, classify_question
+from components.rag_chain import openrouter_chat_model
+
+CLASSIFICATION_CASES = [
+    ("What is the gluten threshold for gluten-free labelling?", "fast"),
+    ("Define refractory coeliac disease", "fast"),
+    ("Which serology test is first line in adults?", "fast"),
+    ("Why can tTG-IgA be falsely negative and how should IgA deficiency be managed?", "reasoning"),
+    ("Compare the ESPGHAN and BSG criteria for diagnosis without biopsy in children", "reasoning"),
+    ("Should a patient on methotrexate with persistent villous atrophy be re-biopsied?", "reasoning"),
+]
+
+MESSAGES = [HumanMessage(content="Summarize the follow-up schedule for newly diagnosed coeliac disease.")]
+
+
+class StubRoutes:
+    """One stub server per route name on consecutive ports"""
+
+    def __init__(self, base_port, **routes):
+        self.servers = {}
+        self.llms = {}
+        for offset, (name, settings) in enumerate(routes.items()):
+            port = base_port + offset
+            self.servers[name] = serve(port, name=name, answer_tokens=20, **settings)
+            self.llms[name] = openrouter_chat_model(
+                f"stub-{name}", base_url=f"http://127.0.0.1:{port}/v1", max_retries=0
+            )
+
+    def requests_served(self, name):
+        port = self.servers[name].server_address[1]
+        return requests.get(f"http://127.0.0.1:{port}/stats", timeout=5).json()["requests"]
+
+    def configure(self, name, **settings):
+        vars(self.servers[name].RequestHandlerClass.config).update(settings)
+
+    def shutdown(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+
+async def ask(router, tier):
+    """Returns (winning route, answer, seconds)"""
+    start = time.perf_counter()
+    winner, tokens = None, []
+    async for name, chunk in router.astream(tier, MESSAGES):
+        winner = name
+        tokens.append(chunk.content)
+    return winner, "".join(tokens), time.perf_counter() - start
+
+
+def check(results, name, passed, detail):
+    results.append({"scenario": name, "passed": bool(passed), **detail})
+    print(f"{'PASS' if passed else 'FAIL'}  {name}: {json.dumps(detail)}")
+
+
+async def run(args):
+    results = []
+    fast = {"ttft": 0.05, "tps": 500}
+    slow = {"ttft": args.reasoning_ttft, "tps": 200}
+
+    misrouted = [(q, expected) for q, expected in CLASSIFICATION_CASES if classify_question(q) != expected]
+    check(results, "classification", not misrouted, {"misrouted": misrouted})
+
+    stubs = StubRoutes(args.port, fast=fast, reasoning=slow)
+    try:
+        router = ModelRouter(stubs.llms, hedge_after=args.hedge_after)
+        fast_winner, fast_answer, fast_s = await ask(router, "fast")
+        reasoning_winner, _, reasoning_s = await ask(router, "reasoning")
+        check(results, "routing", fast_winner == "fast" and fast_answer.startswith("fast")
+              and reasoning_winner == "reasoning",
+              {"fast": [fast_winner, round(fast_s, 3)], "reasoning": [reasoning_winner, round(reasoning_s, 3)]})
+    finally:
+        stubs.shutdown()
+
+    stubs = StubRoutes(args.port + 5, reasoning=fast, fallback=fast)
+    try:
+        router = ModelRouter(stubs.llms, hedge_after=args.hedge_after)
+        lookup_winner, _, _ = await ask(router, classify_question(CLASSIFICATION_CASES[0][0]))
+        stubs.configure("reasoning", error_rate=1.0)
+        failover_winner, _, _ = await ask(router, "fast")
+        check(results, "fallback only", lookup_winner == "reasoning" and failover_winner == "fallback",
+              {"lookup": lookup_winner, "reasoning_down": failover_winner})
+    finally:
+        stubs.shutdown()
+
+    hang = args.hedge_after * 6
+    stubs = StubRoutes(args.port + 10, reasoning={**slow, "hang": hang}, fallback=fast)
+    try:
+        router = ModelRouter(stubs.llms, hedge_after=args.hedge_after)
+        winner, answer, seconds = await ask(router, "reasoning")
+        check(results, "hedging", winner == "fallback" and answer.startswith("fallback")
+              and args.hedge_after <= seconds < hang and router.hedged == 1,
+              {"winner": winner, "seconds": round(seconds, 3), "hedged": router.hedged, "primary_hang_s": hang})
+    finally:
+        stubs.shutdown()
+
+    stubs = StubRoutes(args.port + 20, reasoning={**fast, "error_rate": 1.0}, fallback=fast)
+    try:
+        router = ModelRouter(stubs.llms, hedge_after=args.hedge_after * 10,
+                             failure_threshold=args.breaker_failures, reset_timeout=args.breaker_reset)
+        winner, _, seconds = await ask(router, "reasoning")
+        check(results, "failover", winner == "fallback" and seconds < args.hedge_after * 10,
+              {"winner": winner, "seconds": round(seconds, 3)})
+
+        for _ in range(args.breaker_failures + 3):
+            await ask(router, "reasoning")
+        served_open = stubs.requests_served("reasoning")
+        for _ in range(5):
+            winner, _, _ = await ask(router, "reasoning")
+        served_after = stubs.requests_served("reasoning")
+        state = router.routes["reasoning"].breaker.state
+        check(results, "breaker opens", state == "open" and served_after == served_open and winner == "fallback",
+              {"breaker": state, "primary_requests_while_open": served_after - served_open,
+               "router": router.stats()["routes"]})
+
+        stubs.configure("reasoning", error_rate=0.0)
+        await asyncio.sleep(args.breaker_reset)
+        winner, _, _ = await ask(router, "reasoning")
+        state = router.routes["reasoning"].breaker.state
+        check(results, "breaker recovers", winner == "reasoning" and state == "closed",
+              {"winner": winner, "breaker": state})
+    finally:
+        stubs.shutdown()
+
+    # The primary answers after 1.5x the deadline, so the hedge into the half-open
+    # fallback loses the race without itself missing a deadline
+    stubs = StubRoutes(args.port + 25, reasoning={**fast, "ttft": args.hedge_after * 1.5},
+                       fallback={**fast, "error_rate": 1.0})
+    try:
+        router = ModelRouter(stubs.llms, hedge_after=args.hedge_after,
+                             failure_threshold=1, reset_timeout=args.breaker_reset)
+        await ask(router, "fallback")
+        breaker = router.routes["fallback"].breaker
+        opened = breaker.state
+        stubs.configure("fallback", error_rate=0.0, hang=args.hedge_after * 6)
+        await asyncio.sleep(args.breaker_reset)
+        race_winner, _, _ = await ask(router, "reasoning")
+        trial_released = breaker.state == "half_open" and not breaker.trial_in_flight
+        stubs.configure("fallback", hang=0.0)
+        stubs.configure("reasoning", error_rate=1.0)
+        next_winner, _, _ = await ask(router, "reasoning")
+        check(results, "half-open hedge", opened == "open" and race_winner == "reasoning" and trial_released
+              and next_winner == "fallback" and breaker.state == "closed",
+              {"opened": opened, "race_winner": race_winner, "trial_released": trial_released,
+               "next_winner": next_winner, "breaker": breaker.state})
+    finally:
+        stubs.shutdown()
+
+    stubs = StubRoutes(args.port + 30, reasoning={**fast, "error_rate": 1.0}, fallback={**fast, "error_rate": 1.0})
+    try:
+        router = ModelRouter(stubs.llms, hedge_after=args.hedge_after)
+        try:
+            await ask(router, "reasoning")
+            error = None
+        except Exception as e:
+            error = type(e).__name__
+        check(results, "exhaustion", error is not None, {"error": error})
+    finally:
+        stubs.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hedge-after", type=float, default=0.5, help="seconds before hedging to the fallback")
+    parser.add_argument("--reasoning-ttft", type=float, default=0.2)
+    parser.add_argument("--breaker-failures", type=int, default=3)
+    parser.add_argument("--breaker-reset", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=9300)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    os.environ.setdefault("OPENROUTER_API_KEY", "offline-benchmark")
+
+    results = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
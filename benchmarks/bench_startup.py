@@ -0,0 +1,69 @@
+# benchmarks/bench_startup.py
+"""Measure cold-start-to-listening and cold-start-to-ready times for the server.
+
+Starts `python main.py` (or --command) in --cwd and polls /health and /ready.
+To compare before/after, point --cwd at a checkout of the older revision;
+servers without /ready are reported as ready when they start listening,
+which is what the old blocking lifespan hook meant.
+
+    python -m benchmarks.bench_startup --cwd . --port 8080
+"""
+import argparse
+import json
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+
+def wait_for(url, deadline, accept_404=False):
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code == 200 or (accept_404 and response.status_code == 404):
+                return response.status_code
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cwd", default=".")
+    parser.add_argument("--command", default=f"{sys.executable} main.py")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    deadline = start + args.timeout
+    process = subprocess.Popen(shlex.split(args.command), cwd=args.cwd,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listening = wait_for(f"{base}/health", deadline)
+        listening_s = time.perf_counter() - start if listening else None
+        ready = wait_for(f"{base}/ready", deadline, accept_404=True)
+        ready_s = time.perf_counter() - start if ready else None
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    result = {
+        "cwd": str(Path(args.cwd).resolve()),
+        "listening_s": listening_s,
+        "ready_s": ready_s,
+        "has_ready_endpoint": ready == 200,
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# benchmarks/bench_workers.py
+"""Throughput of the snapshot-serving mode as the worker count grows.
+
+Publishes a synthetic index snapshot, starts a stub OpenAI-compatible
+server for generation and query embeddings, then for each worker count
+starts `python main.py` with RAG_WORKERS=n against the snapshot and drives
+it with concurrent /query clients. Reports requests/second and scaling
+efficiency relative to one worker (1.0 = perfectly linear).
+
+The stub LLM is fast by default, so per-request CPU work (retrieval, BM25,
+context packing, JSON) dominates: that is what extra workers parallelize.
+Note each worker applies its own RAG_MAX_CONCURRENCY cap.
+
+    python -m benchmarks.bench_workers --workers 1,2,4 --chunks 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from benchmarks.run_benchmarks import QUESTIONS, git_revision, populate
+from benchmarks.stub_server import serve
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+
+
+def build_snapshot(snapshot_dir, chunks, dimension):
+    from components.rag_chain import RAGChain
+    from components.snapshot import new_version, publish, staging_path
+
+    version = new_version()
+    staging = staging_path(snapshot_dir, version)
+    rag_chain = RAGChain(
+        llm=StubChatModel(),
+        embedding_function=StubEmbeddings(dimension=dimension, latency=0, per_input_latency=0),
+        persist_directory=str(staging / "chroma_db"),
+        cache_dir=snapshot_dir
+    )
+    populate(rag_chain, chunks, dimension, rag_chain.bm25_index is not None)
+    rag_chain.initialize(None)
+    if rag_chain.bm25_index is not None:
+        rag_chain.bm25_index.save()
+    rag_chain.db.persist()
+    publish(snapshot_dir, staging, {
+        "version": version,
+        "created_at": time.time(),
+        "previous": None,
+        "collection_name": rag_chain.collection_name,
+        "embedding_model": "stub",
+        "chunks": chunks,
+    })
+
+
+def wait_ready(url, process, timeout, consecutive=20):
+    """Every worker must be up: require a run of consecutive 200s from /ready"""
+    deadline = time.perf_counter() + timeout
+    streak = 0
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            streak = streak + 1 if requests.get(f"{url}/ready", timeout=2).status_code == 200 else 0
+        except requests.RequestException:
+            streak = 0
+        if streak >= consecutive:
+            return
+        time.sleep(0.05)
+    raise RuntimeError("Server did not become ready in time")
+
+
+def drive(url, total, concurrency, offset):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    latencies = []
+
+    def one(i):
+        # Distinct questions so neither coalescing nor the answer cache hides the work
+        question = f"{QUESTIONS[i % len(QUESTIONS)]} [{offset + i}]"
+        start = time.perf_counter()
+        session.post(f"{url}/query", json={"text": question}, timeout=600).raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_second": total / wall,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-concurrency", type=int, default=16, help="RAG_MAX_CONCURRENCY per worker")
+    parser.add_argument("--llm-ttft", type=float, default=0.02)
+    parser.add_argument("--llm-tps", type=float, default=5000.0)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--stub-port", type=int, default=9190)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    worker_counts = [int(count) for count in args.workers.split(",") if count]
+
+    os.environ.setdefault("OPENROUTER_API_KEY", "offline-benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    stub = serve(args.stub_port, ttft=args.llm_ttft, tps=args.llm_tps, dimension=args.dimension, embed_latency=0)
+    stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+
+    results = {"revision": git_revision(), "config": vars(args), "runs": []}
+    with tempfile.TemporaryDirectory() as workdir:
+        snapshot_dir = Path(workdir) / "snapshots"
+        build_snapshot(snapshot_dir, args.chunks, args.dimension)
+
+        url = f"http://127.0.0.1:{args.port}"
+        for workers in worker_counts:
+            env = {
+                **os.environ,
+                "RAG_SNAPSHOT_DIR": str(snapshot_dir),
+                "RAG_WORKERS": str(workers),
+                "PORT": str(args.port),
+                "OPENROUTER_BASE_URL": stub_url,
+                "OPENAI_API_BASE": stub_url,
+                "RAG_EMBEDDINGS": "openai",
+                "RAG_ANSWER_CACHE": "0",
+                "RAG_TIMING_LOG": "",
+                "RAG_MAX_CONCURRENCY": str(args.llm_concurrency),
+            }
+            process = subprocess.Popen([sys.executable, "main.py"], env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_ready(url, process, timeout=300)
+                drive(url, args.concurrency, args.concurrency, offset=-args.concurrency)  # warm-up
+                run = {"workers": workers, **drive(url, args.requests, args.concurrency, offset=workers * 10 ** 6)}
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+            baseline = results["runs"][0]["requests_per_second"] if results["runs"] else run["requests_per_second"]
+            baseline_workers = results["runs"][0]["workers"] if results["runs"] else workers
+            run["scaling_efficiency"] = run["requests_per_second"] / (baseline * workers / baseline_workers)
+            results["runs"].append(run)
+            print(f"{workers} worker(s): {run['requests_per_second']:.1f} req/s, p50 {run['p50_ms']:.0f} ms, "
+                  f"efficiency {run['scaling_efficiency']:.2f}")
+    stub.shutdown()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
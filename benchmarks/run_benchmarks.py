@@ -0,0 +1,277 @@
+# benchmarks/run_benchmarks.py
+"""Offline benchmark suite: RAGChain and the FastAPI app on local stand-ins.
+
+No OpenRouter or OpenAI calls are made: StubChatModel and StubEmbeddings
+replace ChatOpenAI and OpenAIEmbeddings with deterministic output and
+configurable latency. Covers ingestion throughput, retrieval latency as the
+corpus grows, end-to-end latency percentiles under concurrent load, and
+memory. Results are written as JSON so runs can be diffed.
+
+    python -m benchmarks.run_benchmarks --sizes 1000,10000,100000 --output results.json
+    python -m benchmarks.run_benchmarks --sections retrieval --sizes 1000000 --no-hybrid
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bench_embeddings import WORDS
+from benchmarks.stubs import StubChatModel, StubEmbeddings
+
+QUESTIONS = [
+    "How is seronegative coeliac disease diagnosed?",
+    "Should tTG-IgA be measured on a gluten-free diet?",
+    "What does Marsh 3a mean?",
+    "When is HLA-DQ2/DQ8 testing useful?",
+    "How is refractory coeliac disease managed?",
+    "What are the FDA warnings for methotrexate?",
+    "Are oats safe on a gluten-free diet?",
+    "How is dermatitis herpetiformis treated?",
+]
+SOURCES = ["ACG", "BSG", "ESsCD", "MED-FDA"]
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": sum(ordered) / len(ordered)}
+
+
+def memory_snapshot():
+    """Current and peak RSS of this process in MB"""
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    current_mb = None
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        current_mb = int(statm.read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    return {"rss_mb": current_mb, "peak_rss_mb": peak_mb}
+
+
+def synthetic_chunk(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(120, 200)))
+
+
+def synthetic_batches(count, batch_size=250, seed=0):
+    """Yield Document batches shaped like DataProcessor.process_documents output"""
+    from langchain.schema import Document
+    from components.data_processor import DataProcessor
+
+    rng = random.Random(seed)
+    batch = []
+    for i in range(count):
+        source = SOURCES[i % len(SOURCES)]
+        text = f"[{i}] " + synthetic_chunk(rng)
+        batch.append(Document(page_content=text, metadata={
+            "source": source, "chunk_id": DataProcessor.chunk_id(source, text)
+        }))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def make_chain(workdir, args):
+    from components.rag_chain import RAGChain
+
+    llm = StubChatModel(ttft=args.llm_ttft, tokens_per_second=args.llm_tps, answer_tokens=args.answer_tokens)
+    embeddings = StubEmbeddings(dimension=args.dimension, latency=args.embed_latency,
+                                per_input_latency=args.embed_per_input)
+    return RAGChain(llm=llm, embedding_function=embeddings,
+                    persist_directory=str(Path(workdir) / "chroma_db"))
+
+
+def bench_ingestion(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        rag_chain = make_chain(workdir, args)
+        start = time.perf_counter()
+        rag_chain.initialize(synthetic_batches(args.ingest_chunks))
+        elapsed = time.perf_counter() - start
+        return {
+            "chunks": args.ingest_chunks,
+            "seconds": elapsed,
+            "chunks_per_second": args.ingest_chunks / elapsed,
+            "embedding_calls": rag_chain.embedding_function.calls,
+            "memory": memory_snapshot(),
+        }
+
+
+def populate(rag_chain, size, dimension, hybrid):
+    """Fill the collection directly with random unit vectors; far faster than embedding 1M texts"""
+    db = rag_chain.open_db()
+    np_rng = np.random.default_rng(size)
+    for batch in synthetic_batches(size, batch_size=5000, seed=size):
+        vectors = np_rng.standard_normal((len(batch), dimension)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        db._collection.add(
+            ids=[doc.metadata["chunk_id"] for doc in batch],
+            embeddings=vectors.tolist(),
+            documents=[doc.page_content for doc in batch],
+            metadatas=[doc.metadata for doc in batch],
+        )
+        if hybrid:
+            for doc in batch:
+                rag_chain.bm25_index.add(doc.metadata["chunk_id"], doc.page_content, doc.metadata)
+
+
+def bench_retrieval(args):
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            rag_chain = make_chain(workdir, args)
+            start = time.perf_counter()
+            populate(rag_chain, size, args.dimension, rag_chain.bm25_index is not None)
+            rag_chain.initialize(None)
+            build_s = time.perf_counter() - start
+
+            stages = {}
+            totals = []
+            for i in range(args.retrieval_queries):
+                question = QUESTIONS[i % len(QUESTIONS)] + f" ({i})"
+                embedding = rag_chain.embedding_function.vector(question)
+                start = time.perf_counter()
+                _, timings = rag_chain.retrieve(question, embedding)
+                totals.append((time.perf_counter() - start) * 1000)
+                for stage, value in timings.items():
+                    stages.setdefault(stage, []).append(value)
+
+            results.append({
+                "chunks": size,
+                "build_seconds": build_s,
+                "total_ms": percentiles(totals),
+                "stages_ms": {stage: percentiles(values) for stage, values in stages.items()},
+                "memory": memory_snapshot(),
+            })
+            print(f"retrieval @ {size} chunks: p50 {results[-1]['total_ms']['p50']:.1f} ms")
+    return results
+
+
+async def bench_end_to_end(args):
+    import httpx
+    import main
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rag_chain = make_chain(workdir, args)
+        rag_chain.initialize(synthetic_batches(args.e2e_chunks))
+        main.rag_chain = rag_chain
+        main.init_state.update(status="ready", ready_at=time.time())
+
+        transport = httpx.ASGITransport(app=main.app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for endpoint in ("/query", "/query/stream"):
+                latencies, ttfts = [], []
+                counter = iter(range(args.e2e_requests))
+
+                async def worker():
+                    for i in counter:
+                        # Distinct questions so coalescing doesn't hide the generation cost
+                        question = {"text": f"{QUESTIONS[i % len(QUESTIONS)]} [{endpoint} {i}]"}
+                        start = time.perf_counter()
+                        if endpoint == "/query":
+                            response = await client.post(endpoint, json=question)
+                            response.raise_for_status()
+                        else:
+                            first_token = None
+                            async with client.stream("POST", endpoint, json=question) as response:
+                                async for line in response.aiter_lines():
+                                    if first_token is None and '"type": "token"' in line:
+                                        first_token = time.perf_counter()
+                            if first_token is not None:
+                                ttfts.append((first_token - start) * 1000)
+                        latencies.append((time.perf_counter() - start) * 1000)
+
+                llm_calls_before = rag_chain.llm_calls
+                start = time.perf_counter()
+                await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+                wall = time.perf_counter() - start
+                results[endpoint] = {
+                    "requests": args.e2e_requests,
+                    "concurrency": args.concurrency,
+                    "latency_ms": percentiles(latencies),
+                    "requests_per_second": args.e2e_requests / wall,
+                    "llm_calls": rag_chain.llm_calls - llm_calls_before,
+                }
+                if ttfts:
+                    results[endpoint]["ttft_ms"] = percentiles(ttfts)
+                print(f"e2e {endpoint}: p50 {results[endpoint]['latency_ms']['p50']:.0f} ms, "
+                      f"p99 {results[endpoint]['latency_ms']['p99']:.0f} ms, "
+                      f"{results[endpoint]['requests_per_second']:.1f} req/s")
+        results["memory"] = memory_snapshot()
+        return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", default="ingestion,retrieval,e2e")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated corpus sizes for retrieval (up to 1000000)")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--no-hybrid", action="store_true", help="skip BM25 (pure-Python index is slow at 1M)")
+    parser.add_argument("--ingest-chunks", type=int, default=20000)
+    parser.add_argument("--retrieval-queries", type=int, default=100)
+    parser.add_argument("--e2e-chunks", type=int, default=2000)
+    parser.add_argument("--e2e-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-ttft", type=float, default=0.5, help="stub LLM seconds to first token")
+    parser.add_argument("--llm-tps", type=float, default=100.0, help="stub LLM tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--llm-concurrency", type=int, default=16)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="stub seconds per embedding request")
+    parser.add_argument("--embed-per-input", type=float, default=0.0001)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    sections = set(args.sections.split(","))
+
+    # Stand-in credentials and settings; must be set before the app and chain are imported
+    os.environ.setdefault("OPENROUTER_API_KEY", "offline-benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    os.environ["RAG_ANSWER_CACHE"] = "0"
+    os.environ["RAG_TIMING_LOG"] = ""
+    os.environ["RAG_HYBRID"] = "0" if args.no_hybrid else "1"
+    os.environ["RAG_MAX_CONCURRENCY"] = str(args.llm_concurrency)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+    if "ingestion" in sections:
+        results["ingestion"] = bench_ingestion(args)
+        print(f"ingestion: {results['ingestion']['chunks_per_second']:.0f} chunks/s")
+    if "retrieval" in sections:
+        results["retrieval"] = bench_retrieval(args)
+    if "e2e" in sections:
+        results["end_to_end"] = asyncio.run(bench_end_to_end(args))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
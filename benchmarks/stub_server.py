@@ -0,0 +1,193 @@
+# benchmarks/stub_server.py
+"""OpenAI-compatible stub server for chat completions and embeddings.
+
+Lets the real server (ChatOpenAI via OPENROUTER_BASE_URL, OpenAIEmbeddings
+via OPENAI_API_BASE) run end to end without paid calls. Latency and
+failures are injectable: time to first token, decode rate, a fraction of
+requests that fail with a given status, and an optional hang.
+
+    python -m benchmarks.stub_server --port 9100 --ttft 0.2 --tps 200
+    python -m benchmarks.stub_server --port 9101 --error-rate 0.5 --error-status 503
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_vector(item, dimension):
+    """Deterministic unit vector for a text or a token-id list"""
+    seed = hashlib.sha256(json.dumps(item).encode()).digest()
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimension)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+    counter_lock = threading.Lock()
+    requests_served = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self.send_json(200, {"requests": type(self).requests_served})
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with StubHandler.counter_lock:
+            type(self).requests_served += 1
+
+        config = self.config
+        if config.hang and random.random() < config.hang_rate:
+            time.sleep(config.hang)
+        if random.random() < config.error_rate:
+            self.send_json(config.error_status, {"error": {"message": "injected failure", "code": config.error_status}})
+            return
+
+        if self.path.endswith("/embeddings"):
+            self.embeddings(body)
+        elif self.path.endswith("/chat/completions"):
+            self.chat(body)
+        else:
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def embeddings(self, body):
+        inputs = body.get("input")
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        time.sleep(self.config.embed_latency)
+        data = []
+        for index, item in enumerate(inputs):
+            vector = stub_vector(item, self.config.dimension)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        self.send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub-embedding"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        })
+
+    def chat(self, body):
+        config = self.config
+        prompt = json.dumps(body.get("messages", []))
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        model = body.get("model", "stub-chat")
+        tokens = [f"{config.name}{digest[i % 64]}{i} " for i in range(config.answer_tokens)]
+        created = int(time.time())
+        time.sleep(config.ttft)
+
+        if not body.get("stream"):
+            time.sleep(len(tokens) / config.tps)
+            self.send_json(200, {
+                "id": f"stub-{digest[:12]}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(prompt) // 4 + len(tokens),
+                },
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return json.dumps({
+                "id": f"stub-{digest[:12]}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        try:
+            send_event(chunk({"role": "assistant", "content": ""}))
+            for token in tokens:
+                time.sleep(1 / config.tps)
+                send_event(chunk({"content": token}))
+            send_event(chunk({}, "stop"))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. a hedged request lost the race)
+            pass
+
+
+def serve(port, **settings):
+    """Start a stub server in a background thread; returns the server (call shutdown() to stop)"""
+    parser = build_parser()
+    config = parser.parse_args([])
+    vars(config).update(port=port, **settings)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config, "requests_served": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--name", default="", help="prefix for answer tokens, to tell servers apart")
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds to first token")
+    parser.add_argument("--tps", type=float, default=200.0, help="tokens per second after the first")
+    parser.add_argument("--answer-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang", type=float, default=0.0, help="extra seconds to stall selected requests")
+    parser.add_argument("--hang-rate", type=float, default=1.0, help="fraction of requests that stall")
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--dimension", type=int, default=1536)
+    return parser
+
+
+def main():
+    config = build_parser().parse_args()
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config, "requests_served": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", config.port), handler)
+    server.daemon_threads = True
+    print(f"Stub OpenAI server on http://127.0.0.1:{config.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
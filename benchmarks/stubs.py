@@ -0,0 +1,112 @@
+# benchmarks/stubs.py
+"""Deterministic local stand-ins for the paid upstream services."""
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StubEmbeddings(Embeddings):
+    """Mimics OpenAIEmbeddings: one network round trip per call plus per-input cost.
+
+    Vectors are derived from a hash of the text, so the same text always gets
+    the same unit vector and nothing here touches the network.
+    """
+
+    def __init__(self, dimension=1536, latency=0.25, per_input_latency=0.0005, model="stub-openai"):
+        self.dimension = dimension
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.model = model
+        self.calls = 0
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency + self.per_input_latency * len(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class StubChatModel(BaseChatModel):
+    """Mimics the streaming OpenRouter chat model with a configurable latency profile.
+
+    The answer is derived from a hash of the prompt, so runs are repeatable.
+    `ttft` is the delay before the first token and `tokens_per_second` the
+    decode rate after it; token callbacks fire as ChatOpenAI's do with
+    streaming=True.
+    """
+
+    ttft: float = 0.5
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 200
+    model_name: str = "stub-chat"
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def answer(self, messages):
+        prompt = "".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        return [f"{digest[i % 64]}{i} " for i in range(self.answer_tokens)], len(prompt) // 4
+
+    def _result(self, tokens, prompt_tokens):
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))],
+            llm_output={"token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens)}}
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        tokens, prompt_tokens = self.answer(messages)
+        time.sleep(self.ttft)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+        return self._result(tokens, prompt_tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        tokens, prompt_tokens = self.answer(messages)
+        await asyncio.sleep(self.ttft)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+        return self._result(tokens, prompt_tokens)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        tokens, _ = self.answer(messages)
+        time.sleep(self.ttft)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        tokens, _ = self.answer(messages)
+        await asyncio.sleep(self.ttft)
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
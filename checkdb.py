@@ -1,50 +1,425 @@
-
 #!/usr/bin/env python
 # checkdb.py
-import os
-from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+"""Inspect a Chroma collection and check its integrity, offline and in bounded memory.
+
+Reads Chroma 0.4's SQLite file read-only and streams it page by page.
+Nothing is embedded, no API key is needed and nothing touches the
+network. Reports:
+
+- totals, and chunk/byte statistics per guideline source
+- duplicate chunks (identical text stored under several ids); ids are
+  source-scoped, so the same passage in two guidelines is expected and only
+  fails the check with --strict
+- embedding dimensions of every stored vector (the latest write per
+  chunk) against the collection's declared dimension (and
+  --expected-dimension)
+- consistency of ids, metadata and content hashes
+- orphans: chunks without a vector in the HNSW index, vectors without a
+  chunk, and drift between the collection and the BM25 keyword index
+
+Exits with status 1 if any integrity problem is found (with --strict,
+also if any chunk is duplicated).
+
+    python checkdb.py
+    python checkdb.py --snapshot-dir ./index_snapshots --json
+    python checkdb.py --list
+"""
+import argparse
+import array
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
 from pathlib import Path
 
+DOCUMENT_KEY = "chroma:document"
+# Layout written by BM25Index.save(): {"documents": {chunk id: {"text": ..., "metadata": ...}, ...}}
+KEYWORD_INDEX_PREFIX = re.compile(r'\s*\{\s*"documents"\s*:\s*\{')
+KEY_SEPARATOR = re.compile(r"\s*:\s*")
+ENTRY_DELIMITER = re.compile(r"[\s,]*")
+
+
+class Findings:
+    """Count per problem kind, keeping only the first few example ids"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.counts = defaultdict(int)
+        self.examples = defaultdict(list)
+
+    def add(self, kind, chunk_id):
+        self.counts[kind] += 1
+        if len(self.examples[kind]) < self.limit:
+            self.examples[kind].append(chunk_id)
+
+    def report(self):
+        return {kind: {"count": count, "examples": self.examples[kind]} for kind, count in self.counts.items()}
+
+
+def chroma_uri(persist_directory):
+    path = Path(persist_directory) / "chroma.sqlite3"
+    if not path.exists():
+        raise SystemExit(f"Error: no Chroma database at {path}")
+    return f"file:{path}?mode=ro"
+
+
+def open_readonly(persist_directory):
+    return sqlite3.connect(chroma_uri(persist_directory), uri=True)
+
+
+def list_collections(conn):
+    rows = conn.execute("""
+        SELECT c.name, c.dimension, COUNT(e.id)
+        FROM collections c
+        LEFT JOIN segments s ON s.collection = c.id AND s.scope = 'METADATA'
+        LEFT JOIN embeddings e ON e.segment_id = s.id
+        GROUP BY c.id ORDER BY c.name
+    """).fetchall()
+    return [{"name": name, "dimension": dimension, "chunks": count} for name, dimension, count in rows]
+
+
+def find_collection(conn, name):
+    row = conn.execute("SELECT id, topic, dimension FROM collections WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        names = ", ".join(collection["name"] for collection in list_collections(conn)) or "none"
+        raise SystemExit(f"Error: collection '{name}' not found (available: {names})")
+    collection_id, topic, dimension = row
+    segments = dict(conn.execute("SELECT scope, id FROM segments WHERE collection = ?", (collection_id,)))
+    return {"topic": topic, "dimension": dimension, "metadata_segment": segments.get("METADATA"),
+            "vector_segment": segments.get("VECTOR")}
+
+
+def stream_chunks(conn, segment_id, page_size):
+    """Yield (chunk id, document, metadata) per stored chunk, reading page_size rows at a time"""
+    cursor = conn.execute("""
+        SELECT e.id, e.embedding_id, m.key, m.string_value, m.int_value, m.float_value
+        FROM embeddings e LEFT JOIN embedding_metadata m ON m.id = e.id
+        WHERE e.segment_id = ?
+        ORDER BY e.id
+    """, (segment_id,))
+    current, chunk_id, fields = None, None, {}
+    while True:
+        rows = cursor.fetchmany(page_size)
+        if not rows:
+            break
+        for row_id, embedding_id, key, string_value, int_value, float_value in rows:
+            if row_id != current:
+                if current is not None:
+                    yield chunk_id, fields.pop(DOCUMENT_KEY, None), fields
+                current, chunk_id, fields = row_id, embedding_id, {}
+            if key is not None:
+                fields[key] = next((v for v in (string_value, int_value, float_value) if v is not None), None)
+    if current is not None:
+        yield chunk_id, fields.pop(DOCUMENT_KEY, None), fields
+
+
+def scan_chunks(conn, segment_id, work, page_size, problems):
+    """Per-source stats and id/metadata checks; ids and content hashes go to the work table"""
+    sources = defaultdict(lambda: {"chunks": 0, "bytes": 0, "chars": 0, "min_chars": None, "max_chars": 0})
+    batch = []
+    for chunk_id, document, metadata in stream_chunks(conn, segment_id, page_size):
+        document = document or ""
+        source = metadata.get("source")
+        stats = sources[source or "(none)"]
+        stats["chunks"] += 1
+        stats["bytes"] += len(document.encode())
+        stats["chars"] += len(document)
+        stats["min_chars"] = len(document) if stats["min_chars"] is None else min(stats["min_chars"], len(document))
+        stats["max_chars"] = max(stats["max_chars"], len(document))
+
+        content_hash = hashlib.sha256(document.encode()).hexdigest()[:32]
+        if not document.strip():
+            problems.add("empty_document", chunk_id)
+        if source is None:
+            problems.add("missing_source", chunk_id)
+        if ":" not in chunk_id:
+            problems.add("legacy_id", chunk_id)
+        else:
+            id_source, id_hash = chunk_id.split(":", 1)
+            if source is not None and id_source != source:
+                problems.add("source_mismatch", chunk_id)
+            if id_hash != content_hash:
+                problems.add("hash_mismatch", chunk_id)
+        if metadata.get("chunk_id") not in (None, chunk_id):
+            problems.add("chunk_id_metadata_mismatch", chunk_id)
+
+        batch.append((chunk_id, content_hash, source, len(document.encode())))
+        if len(batch) >= page_size:
+            work.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        work.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", batch)
+    work.commit()
+
+    for stats in sources.values():
+        stats["avg_chars"] = round(stats["chars"] / stats["chunks"]) if stats["chunks"] else 0
+    return dict(sources)
+
+
+def find_duplicates(work, limit):
+    groups = work.execute("""
+        SELECT content_hash, COUNT(*), MAX(bytes), GROUP_CONCAT(chunk_id, ' ')
+        FROM chunks GROUP BY content_hash HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC, MAX(bytes) DESC
+    """)
+    report = {"groups": 0, "redundant_chunks": 0, "redundant_bytes": 0, "examples": []}
+    for content_hash, count, size, ids in groups:
+        report["groups"] += 1
+        report["redundant_chunks"] += count - 1
+        report["redundant_bytes"] += (count - 1) * size
+        if len(report["examples"]) < limit:
+            report["examples"].append({"content_hash": content_hash, "copies": count, "ids": ids.split(" ")[:10]})
+    return report
+
+
+def check_dimensions(work, topic, declared, expected, check_values, page_size, problems):
+    """Dimension histogram of the stored vectors, from Chroma's write log.
+
+    Only the latest write carrying a vector counts for each id, and only
+    for ids still in the collection: replaced and deleted vectors are not
+    read. `work` has the Chroma database attached as `chroma`.
+    """
+    cursor = work.execute("""
+        SELECT q.id, q.vector, q.encoding
+        FROM (SELECT MAX(seq_id) AS seq_id FROM chroma.embeddings_queue
+              WHERE topic = ? AND vector IS NOT NULL GROUP BY id) latest
+        JOIN chroma.embeddings_queue q ON q.seq_id = latest.seq_id
+        JOIN chunks c ON c.chunk_id = q.id
+    """, (topic,))
+    dimensions = defaultdict(int)
+    target = expected or declared
+    while True:
+        rows = cursor.fetchmany(page_size)
+        if not rows:
+            break
+        for chunk_id, blob, encoding in rows:
+            if encoding not in (None, "FLOAT32"):
+                dimensions[f"unknown encoding {encoding}"] += 1
+                continue
+            dimensions[len(blob) // 4] += 1
+            if target and len(blob) // 4 != target:
+                problems.add("wrong_dimension", chunk_id)
+            if check_values:
+                vector = array.array("f", blob)
+                norm = math.sqrt(math.fsum(value * value for value in vector))
+                if math.isnan(norm) or math.isinf(norm) or norm == 0:
+                    problems.add("nan_or_zero_vector", chunk_id)
+    if expected and declared and expected != declared:
+        problems.add("declared_dimension_mismatch", f"declared {declared}, expected {expected}")
+    return {
+        "declared": declared,
+        "expected": expected,
+        "vectors_by_dimension": {str(dimension): count for dimension, count in sorted(dimensions.items(), key=str)},
+    }
+
+
+def load_hnsw_metadata(persist_directory, segment_id):
+    """Chroma's pickled id->label map for the HNSW index, or None if unavailable"""
+    path = Path(persist_directory) / str(segment_id) / "index_metadata.pickle"
+    if not path.exists():
+        return None
+    try:
+        # Unpickling needs Chroma's PersistentData class
+        from chromadb.segment.impl.vector.local_persistent_hnsw import PersistentData
+    except ImportError:
+        return None
+    return PersistentData.load_from_file(str(path))
+
+
+def stream_keyword_ids(bm25_path, block_size=1 << 20):
+    """Yield the chunk ids of a BM25 index file, decoding one entry at a time.
+
+    Keeps about one read block in memory, plus the current entry when an
+    entry is longer than a block.
+    """
+    decoder = json.JSONDecoder()
+    with open(bm25_path, 'r') as f:
+        buffer, eof = f.read(block_size), False
+        prefix = KEYWORD_INDEX_PREFIX.match(buffer)
+        if prefix is None:
+            raise SystemExit(f"Error: {bm25_path} is not a keyword index file")
+        position = prefix.end()
+        while True:
+            if not eof and len(buffer) - position < block_size:
+                block = f.read(block_size)
+                eof = not block
+                buffer, position = buffer[position:] + block, 0
+            position = ENTRY_DELIMITER.match(buffer, position).end()
+            if buffer.startswith("}", position):
+                return
+            try:
+                chunk_id, end = decoder.raw_decode(buffer, position)
+                separator = KEY_SEPARATOR.match(buffer, end)
+                if separator is None:
+                    raise json.JSONDecodeError("Expecting ':' delimiter", buffer, end)
+                _, end = decoder.raw_decode(buffer, separator.end())
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Entry longer than the read-ahead: extend the buffer and decode it again
+                block = f.read(block_size)
+                eof = not block
+                buffer += block
+                continue
+            yield chunk_id
+            position = end
+
+
+def find_orphans(conn, work, persist_directory, collection, bm25_path, problems):
+    report = {}
+    hnsw = load_hnsw_metadata(persist_directory, collection["vector_segment"])
+    if hnsw is None:
+        report["hnsw"] = "skipped (no persisted index metadata, or chromadb not installed)"
+    else:
+        # Writes after the last HNSW flush live only in the log; Chroma replays them on load
+        pending = {row[0] for row in conn.execute(
+            "SELECT DISTINCT id FROM embeddings_queue WHERE topic = ? AND seq_id > ?",
+            (collection["topic"], hnsw.max_seq_id)
+        )}
+        work.execute("CREATE TEMP TABLE vectors (chunk_id TEXT PRIMARY KEY)")
+        work.executemany("INSERT OR IGNORE INTO vectors VALUES (?)", ((key,) for key in hnsw.id_to_label))
+        for (chunk_id,) in work.execute(
+            "SELECT chunk_id FROM chunks WHERE chunk_id NOT IN (SELECT chunk_id FROM vectors)"
+        ):
+            if chunk_id not in pending:
+                problems.add("chunk_without_vector", chunk_id)
+        for (chunk_id,) in work.execute(
+            "SELECT chunk_id FROM vectors WHERE chunk_id NOT IN (SELECT chunk_id FROM chunks)"
+        ):
+            if chunk_id not in pending:
+                problems.add("vector_without_chunk", chunk_id)
+        report["hnsw"] = {"indexed_vectors": len(hnsw.id_to_label), "pending_in_log": len(pending)}
+
+    if bm25_path is None or not Path(bm25_path).exists():
+        report["bm25"] = "skipped (no keyword index file)"
+    else:
+        work.execute("CREATE TEMP TABLE keyword (chunk_id TEXT PRIMARY KEY)")
+        work.executemany("INSERT OR IGNORE INTO keyword VALUES (?)", ((key,) for key in stream_keyword_ids(bm25_path)))
+        for (chunk_id,) in work.execute(
+            "SELECT chunk_id FROM chunks WHERE chunk_id NOT IN (SELECT chunk_id FROM keyword)"
+        ):
+            problems.add("missing_from_keyword_index", chunk_id)
+        for (chunk_id,) in work.execute(
+            "SELECT chunk_id FROM keyword WHERE chunk_id NOT IN (SELECT chunk_id FROM chunks)"
+        ):
+            problems.add("keyword_index_orphan", chunk_id)
+        indexed = work.execute("SELECT COUNT(*) FROM keyword").fetchone()[0]
+        report["bm25"] = {"path": str(bm25_path), "indexed_chunks": indexed}
+    return report
+
+
+def print_report(report):
+    print(f"Collection '{report['collection']}' in {report['persist_directory']}: "
+          f"{report['chunks']} chunks, {report['bytes'] / 2 ** 20:.1f} MiB of text")
+    print(f"\n{'source':<10} {'chunks':>9} {'MiB':>8} {'avg chars':>10} {'min':>6} {'max':>6}")
+    for source, stats in sorted(report["sources"].items()):
+        print(f"{source:<10} {stats['chunks']:>9} {stats['bytes'] / 2 ** 20:>8.2f} "
+              f"{stats['avg_chars']:>10} {stats['min_chars']:>6} {stats['max_chars']:>6}")
+
+    duplicates = report["duplicates"]
+    print(f"\nDuplicates: {duplicates['groups']} groups, {duplicates['redundant_chunks']} redundant chunks "
+          f"({duplicates['redundant_bytes'] / 1024:.1f} KiB)")
+    for example in duplicates["examples"]:
+        print(f"  {example['copies']}x {example['content_hash']}: {', '.join(example['ids'][:3])}")
+
+    dimensions = report["dimensions"]
+    print(f"\nDimensions: declared {dimensions['declared']}, expected {dimensions['expected'] or '-'}, "
+          f"stored vectors by dimension {dimensions['vectors_by_dimension']}")
+
+    print("\nIndexes:")
+    for section, details in report["orphans"].items():
+        if isinstance(details, str):
+            print(f"  {section}: {details}")
+        else:
+            print(f"  {section}: " + ", ".join(f"{key} {value}" for key, value in details.items()))
+
+    print("\nIntegrity:")
+    if not report["problems"]:
+        print("  no problems found")
+    for problem, details in sorted(report["problems"].items()):
+        print(f"  {problem}: {details['count']} (e.g. {', '.join(details['examples'][:3])})")
+
+    status = "OK" if not report["problem_count"] else f"{report['problem_count']} problems found"
+    print(f"\n{status} in {report['elapsed_s']:.1f} s")
+
+
 def main():
-    load_dotenv()
-    
-    # Check for required API key
-    if not os.getenv("OPENAI_API_KEY"):
-        print("Error: OPENAI_API_KEY environment variable is required")
-        return
-    
-    persist_directory = "./chroma_db"
-    collection_name = "hepatology_docs"
-    embedding_function = OpenAIEmbeddings()
-    
-    # Check if the directory exists
-    if not Path(persist_directory).exists():
-        print(f"Error: Vector database directory '{persist_directory}' does not exist")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--snapshot-dir", help="inspect the CURRENT snapshot published by ingest.py")
+    parser.add_argument("--collection", help="collection name (default: from the snapshot or hepatology_docs)")
+    parser.add_argument("--bm25", help="keyword index file (default: <collection>_bm25.json next to the store)")
+    parser.add_argument("--expected-dimension", type=int, help="e.g. 1536 for OpenAI, 384 for MiniLM")
+    parser.add_argument("--check-vectors", action="store_true", help="also decode vectors to find NaN/zero ones")
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--examples", type=int, default=5)
+    parser.add_argument("--list", action="store_true", help="list collections and exit")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--strict", action="store_true", help="count duplicate chunks as problems")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    persist_directory = Path(args.persist_directory)
+    collection_name = args.collection
+    if args.snapshot_dir:
+        from components.snapshot import current_snapshot, load_manifest
+        snapshot = current_snapshot(args.snapshot_dir)
+        if snapshot is None:
+            raise SystemExit(f"Error: no snapshot published in {args.snapshot_dir}")
+        persist_directory = snapshot / "chroma_db"
+        collection_name = collection_name or load_manifest(snapshot)["collection_name"]
+    collection_name = collection_name or "hepatology_docs"
+
+    conn = open_readonly(persist_directory)
+    if args.list:
+        for collection in list_collections(conn):
+            print(f"{collection['name']}: {collection['chunks']} chunks, dimension {collection['dimension']}")
         return
-    
-    try:
-        # Load the database
-        db = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embedding_function,
-            collection_name=collection_name
-        )
-        
-        # Get the document count
-        collection = db.get()
-        doc_count = len(collection['ids'])
-        
-        print(f"Number of documents in collection '{collection_name}': {doc_count}")
-        
-        # Additional information
-        if doc_count > 0:
-            print(f"Document IDs (first 5): {collection['ids'][:5]}")
-            print(f"Metadata example: {collection['metadatas'][0] if collection['metadatas'] else 'None'}")
-        
-    except Exception as e:
-        print(f"Error accessing vector database: {str(e)}")
+
+    collection = find_collection(conn, collection_name)
+    bm25_path = Path(args.bm25) if args.bm25 else persist_directory.parent / f"{collection_name}_bm25.json"
+
+    # Ids and content hashes go to a scratch SQLite file, so memory stays flat however big the collection
+    with tempfile.TemporaryDirectory() as scratch:
+        work = sqlite3.connect(f"file:{Path(scratch) / 'work.sqlite3'}", uri=True)
+        work.execute("PRAGMA journal_mode=OFF")
+        work.execute("PRAGMA synchronous=OFF")
+        # The dimension check joins Chroma's write log against the chunk ids
+        work.execute("ATTACH DATABASE ? AS chroma", (chroma_uri(persist_directory),))
+        work.execute("CREATE TABLE chunks (chunk_id TEXT PRIMARY KEY, content_hash TEXT, source TEXT, bytes INTEGER)")
+        work.execute("CREATE INDEX chunks_hash ON chunks (content_hash)")
+
+        problems = Findings(args.examples)
+        sources = scan_chunks(conn, collection["metadata_segment"], work, args.page_size, problems)
+        report = {
+            "collection": collection_name,
+            "persist_directory": str(persist_directory),
+            "chunks": sum(stats["chunks"] for stats in sources.values()),
+            "bytes": sum(stats["bytes"] for stats in sources.values()),
+            "sources": sources,
+            "duplicates": find_duplicates(work, args.examples),
+            "dimensions": check_dimensions(work, collection["topic"], collection["dimension"],
+                                           args.expected_dimension, args.check_vectors, args.page_size, problems),
+            "orphans": find_orphans(conn, work, persist_directory, collection, bm25_path, problems),
+        }
+        work.close()
+
+    report["problems"] = problems.report()
+    report["problem_count"] = sum(problems.counts.values())
+    if args.strict:
+        report["problem_count"] += report["duplicates"]["redundant_chunks"]
+    report["elapsed_s"] = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(1 if report["problem_count"] else 0)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,230 @@
+# components/answer_cache.py
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AnswerCache:
+    """Semantic answer cache keyed on the question embedding, held in memory.
+
+    A lookup is a hit when the cosine similarity between the new question and
+    a cached one reaches `threshold`. Entries are evicted least-recently-used
+    once `max_entries` is reached and expire after `ttl` seconds. The whole
+    cache is dropped when the collection fingerprint changes, so answers never
+    outlive the documents they were generated from. An optional `scope`
+    (e.g. a source filter) partitions entries: lookups only match answers
+    stored under the same scope.
+
+    Persistence belongs to SharedAnswerCache, which writes one row per
+    change. Async callers run these methods through asyncio.to_thread, so
+    they are serialized by a lock.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=500, ttl=7 * 24 * 3600):
+        self.state_lock = threading.RLock()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fingerprint = None
+        self.entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self._scopes = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load()
+
+    def load(self):
+        """Load persisted entries; the in-memory cache has none"""
+
+    def clear(self):
+        """Drop every cached answer"""
+        self.entries.clear()
+        self._matrix = None
+
+    def check_fingerprint(self, fingerprint):
+        """Invalidate the cache if the underlying collection has changed"""
+        if fingerprint != self.fingerprint:
+            if self.entries:
+                print("Collection changed, invalidating answer cache")
+            self.fingerprint = fingerprint
+            self.clear()
+
+    @staticmethod
+    def normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self):
+        now = time.time()
+        expired = [key for key, entry in self.entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.evictions += len(expired)
+            self._matrix = None
+
+    def lookup(self, embedding, fingerprint, scope=""):
+        """Return the best cached entry above the similarity threshold, or None"""
+        with self.state_lock:
+            self.check_fingerprint(fingerprint)
+            self._expire()
+
+            if self.entries:
+                if self._matrix is None:
+                    self._keys = list(self.entries)
+                    self._scopes = np.array([self.entries[k].get("scope", "") for k in self._keys])
+                    self._matrix = np.stack([self.entries[k]["embedding"] for k in self._keys])
+                scores = self._matrix @ self.normalize(embedding)
+                scores = np.where(self._scopes == scope, scores, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._keys[best]
+                    self.touch(key)
+                    self.hits += 1
+                    return self.entries[key]
+
+            self.misses += 1
+            return None
+
+    def touch(self, key):
+        """Mark an entry as just used"""
+        self.entries.move_to_end(key)
+
+    def store(self, question, embedding, answer, sources, fingerprint, scope=""):
+        """Cache an answer, evicting the least recently used entry when full"""
+        with self.state_lock:
+            self.check_fingerprint(fingerprint)
+            key = " ".join(question.lower().split())
+            if scope:
+                key = f"{scope}|{key}"
+            self.entries[key] = {
+                "key": key,
+                "scope": scope,
+                "question": question,
+                "embedding": self.normalize(embedding),
+                "answer": answer,
+                "sources": sources,
+                "created_at": time.time()
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+            return key
+
+    def stats(self):
+        """Hit-rate metrics for the /cache/stats endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "threshold": self.threshold
+        }
+
+
+class SharedAnswerCache(AnswerCache):
+    """AnswerCache stored in SQLite, written one row at a time.
+
+    Used by every server: a single process gets incremental persistence
+    (a store never rewrites the cache), and several worker processes
+    serving one snapshot share the same file. Each worker keeps the in-memory
+    similarity matrix of the base class and reloads it only when another
+    connection has committed a change (SQLite's data_version counter moves),
+    so a lookup normally costs one PRAGMA.
+    Writes are single-row upserts; hits update `last_used`, and eviction
+    (least recently used) and expiry run in SQL.
+    """
+
+    def __init__(self, cache_path, **kwargs):
+        self.conn = sqlite3.connect(str(cache_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, entry TEXT, embedding BLOB, created_at REAL, last_used REAL)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(entries)")}
+        if "last_used" not in columns:
+            self.conn.execute("ALTER TABLE entries ADD COLUMN last_used REAL")
+            self.conn.execute("UPDATE entries SET last_used = created_at")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.data_version = None
+        super().__init__(**kwargs)
+
+    def load(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+            rows = self.conn.execute(
+                "SELECT entry, embedding FROM entries ORDER BY last_used"
+            ).fetchall()
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.fingerprint = row[0] if row else None
+        self.entries = OrderedDict()
+        for entry_json, blob in rows:
+            entry = json.loads(entry_json)
+            entry["embedding"] = np.frombuffer(blob, dtype=np.float32)
+            self.entries[entry["key"]] = entry
+        self._matrix = None
+
+    def refresh(self):
+        """Reload if another worker has written since the last look"""
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.data_version:
+            self.load()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (self.fingerprint,)
+            )
+            self.conn.commit()
+        self.entries.clear()
+        self._matrix = None
+
+    def lookup(self, embedding, fingerprint, scope=""):
+        with self.state_lock:
+            self.refresh()
+            return super().lookup(embedding, fingerprint, scope)
+
+    def touch(self, key):
+        super().touch(key)
+        with self.lock:
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            # Our own commit moves data_version only for other connections
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def store(self, question, embedding, answer, sources, fingerprint, scope=""):
+        with self.state_lock:
+            self.refresh()
+            key = super().store(question, embedding, answer, sources, fingerprint, scope)
+            entry = self.entries[key]
+            record = {name: value for name, value in entry.items() if name != "embedding"}
+            with self.lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, entry, embedding, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(record), entry["embedding"].tobytes(), entry["created_at"], entry["created_at"])
+                )
+                self.conn.execute(
+                    "DELETE FROM entries WHERE created_at < ? OR key NOT IN "
+                    "(SELECT key FROM entries ORDER BY last_used DESC LIMIT ?)",
+                    (time.time() - self.ttl, self.max_entries)
+                )
+                self.conn.commit()
+                self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            return key
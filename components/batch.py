@@ -0,0 +1,145 @@
+# components/batch.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from components.source_filter import plan_retrieval
+
+JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def item_id(question, sources):
+    """Stable id for an item without one, so a resubmitted file maps onto the same items"""
+    key = json.dumps([" ".join(question.split()), sorted(sources or [])])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def parse_batch(text, max_items=1000, detect=True):
+    """Parse a JSONL question set into batch items.
+
+    Each line is an object with "question" (or "text", as in /query) and
+    optional "id" and "sources". Raises ValueError naming the offending
+    line. Repeated ids are answered once.
+    """
+    items, seen, duplicates = [], set(), 0
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_no}: invalid JSON ({str(e)})")
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {line_no}: expected a JSON object")
+        question = record.get("question") or record.get("text")
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f"Line {line_no}: missing \"question\"")
+        sources = record.get("sources")
+        try:
+            plan = plan_retrieval(question, sources, detect=detect)
+        except ValueError as e:
+            raise ValueError(f"Line {line_no}: {str(e)}")
+        record_id = str(record["id"] if record.get("id") is not None else item_id(question, sources))
+        if record_id in seen:
+            duplicates += 1
+            continue
+        seen.add(record_id)
+        items.append({"id": record_id, "question": question, "plan": plan})
+        if len(items) > max_items:
+            raise ValueError(f"Batch exceeds {max_items} questions")
+    return items, duplicates
+
+
+class BatchJournal:
+    """Append-only log of finished batch items, so a resubmitted job skips them.
+
+    Only successful results are recorded; failed items are retried when the
+    job is resumed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.results = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash; that item simply runs again
+                        continue
+                    self.results[result["id"]] = result
+
+    @classmethod
+    def for_job(cls, job_dir, job_id):
+        if not JOB_ID_PATTERN.match(job_id):
+            raise ValueError("job_id may only contain letters, digits, '.', '_' and '-' (max 64)")
+        return cls(Path(job_dir) / f"{job_id}.jsonl")
+
+    def record(self, result):
+        if result.get("error"):
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock, open(self.path, 'a') as f:
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.results[result["id"]] = result
+
+    async def arecord(self, result):
+        """record() in a worker thread, so the fsync never stalls the event loop"""
+        await asyncio.to_thread(self.record, result)
+
+
+async def run_batch(rag_chain, items, journal=None, duplicates=0):
+    """Yield result records for a batch, then a summary record.
+
+    Items already in the journal are replayed first (marked "resumed"), the
+    rest are answered by RAGChain.aquery_batch. Each fresh result carries
+    progress with the running throughput in questions per minute.
+    """
+    start = time.perf_counter()
+    resumed, pending = [], []
+    for item in items:
+        if journal is not None and item["id"] in journal.results:
+            resumed.append(journal.results[item["id"]])
+        else:
+            pending.append(item)
+
+    for result in resumed:
+        yield {"type": "result", **result, "resumed": True}
+
+    answered = failed = 0
+    async for result in rag_chain.aquery_batch(pending):
+        if journal is not None:
+            await journal.arecord(result)
+        answered += 1
+        failed += bool(result.get("error"))
+        elapsed = time.perf_counter() - start
+        yield {
+            "type": "result",
+            **result,
+            "progress": {
+                "done": len(resumed) + answered,
+                "total": len(items),
+                "questions_per_minute": answered / elapsed * 60 if elapsed else 0.0
+            }
+        }
+
+    elapsed = time.perf_counter() - start
+    yield {
+        "type": "summary",
+        "questions": len(items),
+        "answered": answered - failed,
+        "failed": failed,
+        "resumed": len(resumed),
+        "duplicates": duplicates,
+        "elapsed_s": elapsed,
+        "questions_per_minute": answered / elapsed * 60 if elapsed else 0.0
+    }
@@ -0,0 +1,126 @@
+# components/bm25_index.py
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from langchain.schema import Document
+
+# Keep hyphenated and dotted terms together so "tTG-IgA" or "Marsh 3a" match exactly
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked id lists; each id scores sum(1 / (k + rank))"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """In-process Okapi BM25 inverted index over the same chunks as the vector store.
+
+    Only the chunk text and metadata are persisted; postings are rebuilt on
+    load, which keeps the file format trivial and takes well under a second
+    for the current corpus.
+    """
+
+    def __init__(self, index_path, k1=1.5, b=0.75):
+        self.index_path = Path(index_path)
+        self.k1 = k1
+        self.b = b
+        self.documents = {}
+        self.term_freqs = {}
+        self.doc_lengths = {}
+        self.postings = defaultdict(dict)
+        self.total_length = 0
+        self.load()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.documents
+
+    def load(self):
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, 'r') as f:
+            data = json.load(f)
+        for chunk_id, entry in data["documents"].items():
+            self._index(chunk_id, entry["text"], entry["metadata"])
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "documents": {
+                chunk_id: {"text": text, "metadata": metadata}
+                for chunk_id, (text, metadata) in self.documents.items()
+            }
+        }
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _index(self, chunk_id, text, metadata):
+        freqs = Counter(tokenize(text))
+        self.documents[chunk_id] = (text, metadata)
+        self.term_freqs[chunk_id] = freqs
+        self.doc_lengths[chunk_id] = sum(freqs.values())
+        self.total_length += self.doc_lengths[chunk_id]
+        for term, count in freqs.items():
+            self.postings[term][chunk_id] = count
+
+    def add(self, chunk_id, text, metadata):
+        if chunk_id in self.documents:
+            self.remove([chunk_id])
+        self._index(chunk_id, text, metadata)
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            freqs = self.term_freqs.pop(chunk_id, None)
+            if freqs is None:
+                continue
+            del self.documents[chunk_id]
+            self.total_length -= self.doc_lengths.pop(chunk_id)
+            for term in freqs:
+                postings = self.postings[term]
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query, k=20, sources=None):
+        """Return up to k (chunk_id, score) pairs ranked by BM25 score.
+
+        With `sources`, only chunks whose metadata source is in it are scored.
+        """
+        if not self.documents:
+            return []
+        n_docs = len(self.documents)
+        avg_length = self.total_length / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                if sources and self.documents[chunk_id][1].get("source") not in sources:
+                    continue
+                length = self.doc_lengths[chunk_id]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def get_document(self, chunk_id):
+        text, metadata = self.documents[chunk_id]
+        return Document(page_content=text, metadata=metadata)
@@ -0,0 +1,107 @@
+# components/context_packer.py
+from langchain.schema import Document
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+class ContextPacker:
+    """Assemble retrieved chunks into a compact, relevance-ordered context.
+
+    Documents arrive in relevance order. Overlapping or adjacent chunks from
+    the same source are merged (the splitter's 300-character overlap would
+    otherwise be sent twice), near-identical chunks are dropped, and the
+    remainder is packed greedily into `token_budget`.
+    """
+
+    def __init__(self, token_budget=4000, min_overlap=50, overlap_window=400,
+                 duplicate_threshold=0.9, shingle_size=5):
+        self.token_budget = token_budget
+        self.min_overlap = min_overlap
+        self.overlap_window = overlap_window
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+
+    def _join(self, first, second):
+        """Return first+second with their shared overlap written once, or None if they don't overlap"""
+        if second in first:
+            return first
+        probe = second[:self.min_overlap]
+        if len(probe) < self.min_overlap:
+            return None
+        start = first.find(probe, max(0, len(first) - self.overlap_window))
+        while start != -1:
+            tail = first[start:]
+            if second.startswith(tail):
+                return first + second[len(tail):]
+            start = first.find(probe, start + 1)
+        return None
+
+    def merge_overlapping(self, ranked):
+        """Merge overlapping chunks per source; a merged chunk keeps its best rank"""
+        merged = []
+        for rank, doc in ranked:
+            text = doc.page_content
+            source = doc.metadata.get("source")
+            changed = True
+            while changed:
+                changed = False
+                for i, (other_rank, other) in enumerate(merged):
+                    if other.metadata.get("source") != source:
+                        continue
+                    joined = self._join(other.page_content, text) or self._join(text, other.page_content)
+                    if joined is not None:
+                        merged.pop(i)
+                        rank = min(rank, other_rank)
+                        text = joined
+                        changed = True
+                        break
+            merged.append((rank, Document(page_content=text, metadata=dict(doc.metadata))))
+        return sorted(merged, key=lambda item: item[0])
+
+    def shingles(self, text):
+        words = text.lower().split()
+        size = self.shingle_size
+        return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+    def drop_near_duplicates(self, ranked):
+        kept, kept_shingles = [], []
+        for rank, doc in ranked:
+            shingles = self.shingles(doc.page_content)
+            # Overlap coefficient, so a chunk mostly contained in a merged one also counts
+            duplicate = any(
+                len(shingles & other) / max(min(len(shingles), len(other)), 1) >= self.duplicate_threshold
+                for other in kept_shingles
+            )
+            if not duplicate:
+                kept.append((rank, doc))
+                kept_shingles.append(shingles)
+        return kept
+
+    def pack(self, documents):
+        """Return (packed documents, stats) for relevance-ordered documents"""
+        ranked = list(enumerate(documents))
+        merged = self.merge_overlapping(ranked)
+        unique = self.drop_near_duplicates(merged)
+
+        packed, used = [], 0
+        for _, doc in unique:
+            tokens = estimate_tokens(doc.page_content)
+            # The most relevant chunk is always sent, even if it alone exceeds the budget
+            if packed and used + tokens > self.token_budget:
+                continue
+            packed.append(doc)
+            used += tokens
+
+        stats = {
+            "chunks_in": len(documents),
+            "merged": len(documents) - len(merged),
+            "deduplicated": len(merged) - len(unique),
+            "dropped_for_budget": len(unique) - len(packed),
+            "chunks_out": len(packed),
+            "context_tokens_before": sum(estimate_tokens(doc.page_content) for doc in documents),
+            "context_tokens_after": used,
+        }
+        return packed, stats
@@ -1,15 +1,30 @@
 # components/data_processor.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from pathlib import Path
 import json
 import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+
+
+def split_source(text_splitter, content, source):
+    """Split one source into (chunk, chunk_id) pairs; runs in a worker process"""
+    return [
+        (chunk, DataProcessor.chunk_id(source, chunk))
+        for chunk in text_splitter.split_text(content)
+    ]
 
 
 class DataProcessor:
-    def __init__(self):
-        self.urls = [
+    def __init__(self, urls=None, cache_dir="./document_cache", timeout=(5, 60)):
+        self.urls = urls or [
             "https://www.dropbox.com/scl/fi/go23hsel50p08iz6h2yku/American-College-of-Gastroenterology-Guidelines-Update-Diagnosis-and-Management-of-Celiac-Disease.md?rlkey=0ln8z72vaqlqowdg21s59pxuw&st=r7ua4en6&dl=1",
             "https://www.dropbox.com/scl/fi/cuh0w04r8dnd0b2nk9m8n/Diagnosis-and-management-of-adult-coeliac-disease-guidelines-from-the-British-Society-of-Gastroenterology.md?rlkey=zm65ebf618vc5mpc4yg5ygsxz&st=67q9tpqm&dl=1",
             "https://www.dropbox.com/scl/fi/a8aly2c8m2qk76o5sxuzz/European-Society-for-the-Study-of-Coeliac-Disease-ESsCD-guideline-for-coeliac-disease-and-other-gluten-related-disorders.md?rlkey=ct3e0ax28etvibc8j8rhaqq3c&st=u96xl3bz&dl=1", 
@@ -22,39 +37,142 @@ class DataProcessor:
             separators=["\n\n", "\n", " ", ""]
         )
         self.batch_size = 250
-        self.cache_dir = Path("./document_cache")
+        # Sources are split in parallel worker processes, at most one per source; 1 splits in-process
+        self.split_workers = min(
+            int(os.getenv("RAG_SPLIT_WORKERS", str(os.cpu_count() or 1))), max(len(self.urls), 1)
+        )
+        self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
 
+        # Pooled session with retries for transient failures; (connect, read) timeouts
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"]
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=max(len(self.urls), 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Content hash of each source fetched in the current pass
+        self.fetched_hashes = {}
+        # Sources whose chunks were all yielded by process_documents
+        self.processed_urls = set()
+
+    @staticmethod
+    def chunk_id(source, chunk):
+        """Deterministic chunk id: the same text from the same source always maps to the same id"""
+        content_hash = hashlib.sha256(chunk.encode()).hexdigest()[:32]
+        return f"{source}:{content_hash}"
+
     def get_cache_path(self, url):
         """Generate cache file path for a URL"""
         url_hash = hashlib.md5(url.encode()).hexdigest()
         return self.cache_dir / f"{url_hash}.json"
 
-    def fetch_url(self, url):
-        """Fetch content from URL with caching"""
+    def load_cache_entry(self, url):
         cache_path = self.get_cache_path(url)
+        if not cache_path.exists():
+            return None
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+
+    def save_cache_entry(self, url, entry):
+        with open(self.get_cache_path(url), 'w') as f:
+            json.dump(entry, f)
 
-        # Check cache first
-        if cache_path.exists():
-            print(f"Loading cached content for {url}")
-            with open(cache_path, 'r') as f:
-                return json.load(f)['content']
+    def fetch_url(self, url):
+        """Fetch content from URL, revalidating the cached copy with ETag/Last-Modified"""
+        cached = self.load_cache_entry(url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
 
-        # Fetch if not cached
         try:
-            response = requests.get(url)
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached:
+                print(f"Not modified, using cached content for {url}")
+                self.fetched_hashes[url] = self.cached_hash(cached)
+                return cached['content']
             response.raise_for_status()
             content = response.text
-
-            # Cache the content
-            with open(cache_path, 'w') as f:
-                json.dump({'url': url, 'content': content}, f)
-
-            return content
         except Exception as e:
+            if cached:
+                print(f"Error revalidating {url}, using cached content: {str(e)}")
+                self.fetched_hashes[url] = self.cached_hash(cached)
+                return cached['content']
             print(f"Error fetching {url}: {str(e)}")
             return None
 
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        self.save_cache_entry(url, {
+            'url': url,
+            'content': content,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash,
+            'ingested_hash': self.ingested_hashes(cached)
+        })
+        self.fetched_hashes[url] = content_hash
+        return content
+
+    @staticmethod
+    def cached_hash(cached):
+        """Content hash of a cache entry; entries from before hashing get one computed"""
+        return cached.get('content_hash') or hashlib.sha256(cached['content'].encode()).hexdigest()
+
+    def fetch_all(self):
+        """Fetch every URL concurrently, returning {url: content or None}"""
+        with ThreadPoolExecutor(max_workers=max(len(self.urls), 1)) as pool:
+            return dict(zip(self.urls, pool.map(self.fetch_url, self.urls)))
+
+    @staticmethod
+    def ingested_hashes(cached):
+        """{collection name: content hash last ingested into it} of a cache entry.
+
+        Each embedding model has its own collection, so ingesting into one
+        says nothing about the others. Entries from before the per-collection
+        markers count as not ingested anywhere.
+        """
+        hashes = cached.get('ingested_hash') if cached else None
+        return dict(hashes) if isinstance(hashes, dict) else {}
+
+    def is_ingested(self, url, collection_name):
+        """True when the current content of url was fully ingested into the collection by a previous pass"""
+        content_hash = self.fetched_hashes.get(url)
+        ingested = self.ingested_hashes(self.load_cache_entry(url))
+        return content_hash is not None and ingested.get(collection_name) == content_hash
+
+    def mark_ingested(self, collection_name):
+        """Record that every source split and handed to the collection in this pass is now ingested"""
+        for url in self.processed_urls:
+            content_hash = self.fetched_hashes.get(url)
+            cached = self.load_cache_entry(url)
+            ingested = self.ingested_hashes(cached)
+            if cached and content_hash and ingested.get(collection_name) != content_hash:
+                ingested[collection_name] = content_hash
+                cached['ingested_hash'] = ingested
+                self.save_cache_entry(url, cached)
+
+    @staticmethod
+    def source_for_url(url):
+        """Determine guideline source based on URL"""
+        if "American-College-of-Gastroenterology" in url:
+            return "ACG"
+        elif "British-Society-of-Gastroenterology" in url:
+            return "BSG"
+        elif "European-Society-for-the-Study-of-Coeliac-Disease" in url:
+            return "ESsCD"
+        elif "medication_warnings" in url:
+            return "MED-FDA"
+        return "Unknown"
+
 #    def process_documents(self):
 #        """Process documents with improved chunking"""
 #        all_documents = []
@@ -78,41 +196,99 @@ class DataProcessor:
 #            batch = all_documents[i:i + self.batch_size]
 #            yield batch
 
-    def process_documents(self):
-        """Process documents with improved chunking and metadata"""
-        all_documents = []
-
-        for url in self.urls:
-            print(f"Processing URL: {url}")
-            content = self.fetch_url(url)
-            if content:
-                # Determine guideline source based on URL
-                source = "Unknown"
-                if "American-College-of-Gastroenterology" in url:
-                    source = "ACG"
-                elif "British-Society-of-Gastroenterology" in url:
-                    source = "BSG"
-                elif "European-Society-for-the-Study-of-Coeliac-Disease" in url:
-                    source = "ESsCD"
-                elif "medication_warnings" in url:
-                    source = "MED-FDA"
-
-                # Process the content
-                chunks = self.text_splitter.split_text(content)
-                for chunk in chunks:
-                    document = Document(
-                        page_content=chunk,
-                        metadata={"source": source}
-                    )
-                    all_documents.append(document)
+    def process_documents(self, only_changed_in=None):
+        """Process documents with improved chunking and metadata.
 
-                print(f"Successfully processed {len(chunks)} chunks from {source} guideline")
-            else:
-                print(f"Failed to process {url}")
+        A streaming pipeline: sources are fetched concurrently, split in a
+        process pool as soon as each download finishes, and yielded in
+        batches while later sources are still being fetched and split. At
+        most a few split sources are held in memory at once, so embedding
+        can start on the first batch regardless of corpus size.
+
+        With only_changed_in (a collection name), sources whose content hash
+        matches the version last ingested into that collection are skipped
+        without splitting.
+        """
+        ready = queue.Queue()
+        # Bounds how many split results can wait for the consumer
+        slots = threading.Semaphore(max(self.split_workers, 1) * 2)
+        stopping = threading.Event()
 
-        print(f"Total documents collected: {len(all_documents)}")
+        def fetch_and_split(url):
+            source = self.source_for_url(url)
+            try:
+                content = self.fetch_url(url)
+                if not content:
+                    ready.put((url, source, None))
+                    return
+                if only_changed_in and self.is_ingested(url, only_changed_in):
+                    ready.put((url, source, "skipped"))
+                    return
+                slots.acquire()
+                if stopping.is_set():
+                    ready.put((url, source, None))
+                    return
+                ready.put((url, source, split_pool.submit(split_source, self.text_splitter, content, source)))
+            except Exception as e:
+                print(f"Error preparing {url}: {str(e)}")
+                ready.put((url, source, None))
+
+        if self.split_workers > 1:
+            # Never fork: the caller may run threads (uvicorn, the embedding scheduler) whose
+            # locks a forked child would inherit mid-use
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            split_pool = ProcessPoolExecutor(
+                max_workers=self.split_workers, mp_context=multiprocessing.get_context(method)
+            )
+            # Start the workers now so their start-up overlaps nothing but this call
+            split_pool.submit(int).result()
+        else:
+            split_pool = ThreadPoolExecutor(max_workers=1)
+        fetch_pool = ThreadPoolExecutor(max_workers=min(max(len(self.urls), 1), 8))
+
+        batch = []
+        total = 0
+        try:
+            for url in self.urls:
+                fetch_pool.submit(fetch_and_split, url)
+
+            for _ in self.urls:
+                url, source, split = ready.get()
+                print(f"Processing URL: {url}")
+                if split is None:
+                    print(f"Failed to process {url}")
+                    continue
+                if split == "skipped":
+                    print(f"Skipping unchanged {source} guideline")
+                    continue
+
+                try:
+                    chunks = split.result()
+                except Exception as e:
+                    print(f"Failed to split {url}: {str(e)}")
+                    continue
+                finally:
+                    slots.release()
+
+                for chunk, chunk_id in chunks:
+                    batch.append(Document(
+                        page_content=chunk,
+                        metadata={"source": source, "chunk_id": chunk_id}
+                    ))
+                    if len(batch) >= self.batch_size:
+                        yield batch
+                        batch = []
+                total += len(chunks)
+                self.processed_urls.add(url)
+                print(f"Successfully processed {len(chunks)} chunks from {source} guideline")
 
-        # Yield documents in batches
-        for i in range(0, len(all_documents), self.batch_size):
-            batch = all_documents[i:i + self.batch_size]
-            yield batch
\ No newline at end of file
+            if batch:
+                yield batch
+            print(f"Total documents collected: {total}")
+        finally:
+            # Unblock fetch threads still waiting for a slot if the consumer stopped early
+            stopping.set()
+            for _ in self.urls:
+                slots.release()
+            fetch_pool.shutdown(wait=True)
+            split_pool.shutdown(wait=True, cancel_futures=True)
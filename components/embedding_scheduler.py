@@ -0,0 +1,181 @@
+# components/embedding_scheduler.py
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def parse_reset(value):
+    """Parse OpenAI reset headers such as '1s', '6m0s' or '120ms' into seconds"""
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        amount = float(amount)
+        seconds += {"ms": amount / 1000, "s": amount, "m": amount * 60, "h": amount * 3600}[unit]
+    return seconds
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `capacity` per minute"""
+
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        rate = self.capacity / 60.0
+        self.available = min(self.capacity, self.available + (now - self.updated) * rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        """Block until `amount` units are available, then take them"""
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait_time = (amount - self.available) / (self.capacity / 60.0)
+            time.sleep(min(wait_time, 5.0))
+
+    def update(self, limit=None, remaining=None, reset=None):
+        """Resynchronize with the provider's view of the limit"""
+        with self.lock:
+            self._refill()
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                self.available = min(self.available, float(remaining))
+                if reset and self.available <= 0:
+                    # Nothing left until the provider's window resets
+                    self.available = -self.capacity * reset / 60.0
+
+
+class EmbeddingScheduler:
+    """Embed documents in large batches, several at a time, within the provider's rate limits.
+
+    `embed_batch(texts)` must return `(vectors, headers)`; headers may be empty.
+    Completed batches are handed to `on_batch(documents, vectors)` on the
+    calling thread as soon as they finish, so each one is persisted before the
+    next is written and an interrupted build loses at most the in-flight work.
+    """
+
+    def __init__(self, embed_batch, max_batch_inputs=2048, max_batch_tokens=250_000,
+                 concurrency=4, requests_per_minute=3000, tokens_per_minute=1_000_000,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.embed_batch = embed_batch
+        self.max_batch_inputs = max_batch_inputs
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def estimate_tokens(text):
+        return len(text) // 4 + 1
+
+    def batches(self, documents):
+        """Group documents into batches bounded by input count and estimated tokens"""
+        batch, batch_tokens = [], 0
+        for doc in documents:
+            tokens = self.estimate_tokens(doc.page_content)
+            if batch and (len(batch) >= self.max_batch_inputs
+                          or batch_tokens + tokens > self.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(doc)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def apply_headers(self, headers):
+        if not headers:
+            return
+        self.request_bucket.update(
+            limit=headers.get("x-ratelimit-limit-requests"),
+            remaining=headers.get("x-ratelimit-remaining-requests"),
+            reset=parse_reset(headers.get("x-ratelimit-reset-requests"))
+        )
+        self.token_bucket.update(
+            limit=headers.get("x-ratelimit-limit-tokens"),
+            remaining=headers.get("x-ratelimit-remaining-tokens"),
+            reset=parse_reset(headers.get("x-ratelimit-reset-tokens"))
+        )
+
+    @staticmethod
+    def is_rate_limit(error):
+        status = getattr(error, "status_code", None)
+        return status == 429 or "rate_limit" in str(error).lower() or "rate limit" in str(error).lower()
+
+    def retry_after(self, error, attempt):
+        """Honour Retry-After when the provider sends it, else exponential backoff with jitter"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        self.apply_headers(headers)
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def embed_with_retries(self, batch):
+        texts = [doc.page_content for doc in batch]
+        tokens = sum(self.estimate_tokens(text) for text in texts)
+        for attempt in range(self.max_retries):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+            try:
+                vectors, headers = self.embed_batch(texts)
+                self.apply_headers(headers)
+                return vectors
+            except Exception as e:
+                # Rate limits, server errors and connection failures (no status) are transient
+                status = getattr(e, "status_code", None)
+                retryable = self.is_rate_limit(e) or status is None or status >= 500
+                if not retryable or attempt == self.max_retries - 1:
+                    raise
+                wait_time = self.retry_after(e, attempt)
+                print(f"Embedding batch failed ({str(e)[:80]}), retrying in {wait_time:.1f} seconds...")
+                time.sleep(wait_time)
+
+    def run(self, documents, on_batch):
+        """Embed every document, calling `on_batch` for each completed batch.
+
+        Returns the number of documents embedded.
+        """
+        done_count = 0
+        batch_iter = self.batches(documents)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            in_flight = {}
+
+            def submit_next():
+                batch = next(batch_iter, None)
+                if batch is None:
+                    return False
+                in_flight[pool.submit(self.embed_with_retries, batch)] = batch
+                return True
+
+            for _ in range(self.concurrency):
+                if not submit_next():
+                    break
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    on_batch(batch, future.result())
+                    done_count += len(batch)
+                    print(f"Embedded {done_count} new chunks")
+                    submit_next()
+        return done_count
@@ -0,0 +1,143 @@
+# components/embeddings.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def embed_with_headers(embeddings, texts):
+    """Embed texts in one request, returning (vectors, response headers).
+
+    OpenAI embeddings go through the raw client so the caller can see the
+    x-ratelimit-* headers; any other backend returns empty headers.
+    """
+    client = getattr(embeddings, "client", None)
+    if client is None or not hasattr(client, "with_raw_response"):
+        return embeddings.embed_documents(texts), {}
+    raw = client.with_raw_response.create(input=texts, model=embeddings.model)
+    response = raw.parse()
+    return [item.embedding for item in response.data], raw.headers
+
+
+class LocalEmbeddings(Embeddings):
+    """CPU sentence-transformers model; no network round trip per query"""
+
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", batch_size=64):
+        # Deferred import: torch is only loaded when the local backend is selected
+        from sentence_transformers import SentenceTransformer
+
+        self.model = model_name
+        self.batch_size = batch_size
+        self.encoder = SentenceTransformer(model_name, device="cpu")
+
+    def embed_documents(self, texts):
+        vectors = self.encoder.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """Persistent embedding cache keyed by (model, text hash) in front of any backend.
+
+    Vectors are stored as float32 blobs in a local SQLite file, so re-ingests
+    and repeated queries never recompute an embedding they have seen before.
+    """
+
+    def __init__(self, embeddings, cache_path):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.cache_path = Path(cache_path)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.cache_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, keys, vectors):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in zip(keys, vectors)]
+            )
+            self.conn.commit()
+
+    def embed_documents_with_headers(self, texts):
+        """Embed texts, computing only cache misses in a single backend call"""
+        keys = [self.key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        headers = {}
+        if missing:
+            vectors, headers = embed_with_headers(self.embeddings, list(missing.values()))
+            self._store(list(missing), vectors)
+            found.update(zip(missing, vectors))
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [found[key] for key in keys], headers
+
+    def embed_documents(self, texts):
+        return self.embed_documents_with_headers(texts)[0]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+
+def get_embedding_function(cache_dir="."):
+    """Build the embedding backend selected by RAG_EMBEDDINGS ("openai" or "local")"""
+    backend = os.getenv("RAG_EMBEDDINGS", "openai")
+    if backend == "local":
+        embeddings = LocalEmbeddings(
+            os.getenv("RAG_LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        )
+    elif backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings()
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if os.getenv("RAG_EMBEDDING_CACHE", "1") != "1":
+        return embeddings
+    return CachedEmbeddings(embeddings, Path(cache_dir) / "embedding_cache.sqlite3")
@@ -0,0 +1,126 @@
+# components/metrics.py
+import os
+import threading
+from collections import defaultdict
+
+# Milliseconds for pipeline stages, seconds for end-to-end figures
+MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    labels = _format_labels(self.labelnames, key, [("le", bound)])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Metrics:
+    """Prometheus-style metrics for the RAG pipeline, rendered by GET /metrics.
+
+    With RAG_METRICS=0 every recording call returns immediately, so the
+    instrumentation costs one attribute check per call site.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.request_seconds = Histogram(
+            "rag_request_seconds", "End-to-end request latency", SECONDS_BUCKETS, ("endpoint", "cached"))
+        self.retrieval_ms = Histogram(
+            "rag_retrieval_ms", "Retrieval stage latency in milliseconds", MS_BUCKETS, ("stage",))
+        self.runnable_ms = Histogram(
+            "rag_runnable_ms", "Latency of each runnable in the answer chain", MS_BUCKETS, ("runnable",))
+        self.ttft_seconds = Histogram(
+            "rag_ttft_seconds", "Time from LLM call to first token", SECONDS_BUCKETS)
+        self.generation_seconds = Histogram(
+            "rag_generation_seconds", "LLM generation time", SECONDS_BUCKETS)
+        self.tokens_per_second = Histogram(
+            "rag_generation_tokens_per_second", "Completion tokens per second", RATE_BUCKETS)
+        self.prompt_tokens = Histogram(
+            "rag_prompt_tokens", "Prompt tokens per LLM call", TOKEN_BUCKETS)
+        self.llm_calls = Counter("rag_llm_calls_total", "Upstream LLM calls, including retries")
+        self.retries = Counter("rag_llm_retries_total", "LLM call retries")
+        self.model_calls = Counter(
+            "rag_model_calls_total", "Routed model calls by route and outcome", ("route", "outcome"))
+        self.hedged_requests = Counter("rag_hedged_requests_total", "Requests hedged to a second model")
+        self.breaker_opens = Counter("rag_circuit_breaker_opens_total", "Circuit breaker openings", ("route",))
+        self.cache_lookups = Counter("rag_answer_cache_lookups_total", "Answer cache lookups", ("result",))
+
+    def all(self):
+        return [value for value in vars(self).values() if isinstance(value, (Counter, Histogram))]
+
+    def observe(self, metric, value, **labels):
+        if self.enabled:
+            metric.observe(value, **labels)
+
+    def inc(self, metric, amount=1, **labels):
+        if self.enabled:
+            metric.inc(amount, **labels)
+
+    def render(self):
+        lines = []
+        for metric in self.all():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics(enabled=os.getenv("RAG_METRICS", "1") == "1")
@@ -0,0 +1,311 @@
+# components/model_router.py
+import asyncio
+import re
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from components.metrics import METRICS
+
+# Cues that a question needs synthesis rather than a single fact
+REASONING_PATTERN = re.compile(
+    r"\b(?:why|how should|how do(?:es)? .+ compare|compare|comparison|versus|vs\.?|differ\w*|"
+    r"explain|manage\w*|approach|strategy|recommend\w*|should|risks?|benefits?|"
+    r"interpret\w*|differential|workup|work-up|algorithm|pros and cons|when to)\b",
+    re.IGNORECASE
+)
+
+
+def classify_question(question, max_fast_words=18):
+    """Route short lookup questions to the fast model and everything else to the reasoning model"""
+    words = len(question.split())
+    if words > max_fast_words or question.count("?") > 1 or REASONING_PATTERN.search(question):
+        return "reasoning"
+    return "fast"
+
+
+async def first_token(stream):
+    """Advance a chunk stream to its first non-empty chunk; returns the chunks read so far"""
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        if chunk.content:
+            return chunks
+    raise RuntimeError("Model returned an empty response")
+
+
+class CircuitBreaker:
+    """Skip a provider after consecutive failures, then let one trial request through.
+
+    closed: requests flow. After `failure_threshold` consecutive failures the
+    breaker opens and the provider is skipped for `reset_timeout` seconds;
+    then it is half-open and the next request is a trial whose outcome closes
+    or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        """A call ended without a verdict (cancelled): free the half-open trial slot"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """Returns True if this failure opened the breaker"""
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                was_closed = self.opened_at is None
+                self.opened_at = time.monotonic()
+                return was_closed
+            return False
+
+
+class ModelRoute:
+    def __init__(self, name, llm, breaker):
+        self.name = name
+        self.llm = llm
+        self.breaker = breaker
+        self.calls = 0
+        self.wins = 0
+        self.failures = 0
+
+
+class ModelRouter:
+    """Pick a model per question and fail over between providers.
+
+    `routes` maps "fast", "reasoning" and optionally "fallback" to chat
+    models. A question goes to its tier's model; if no token arrives within
+    `hedge_after` seconds (or the model fails first) the same request is
+    also sent to the next healthy model and the first to produce a token
+    wins. Models whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, routes, hedge_after=20.0, failure_threshold=3, reset_timeout=60.0):
+        self.routes = {
+            name: ModelRoute(name, llm, CircuitBreaker(failure_threshold, reset_timeout))
+            for name, llm in routes.items() if llm is not None
+        }
+        self.hedge_after = hedge_after
+        self.hedged = 0
+
+    def candidates(self, tier):
+        """Routes to try in order: the tier's model, then the fallback, then the other tier"""
+        if tier not in self.routes:
+            # e.g. only a fallback is configured: short questions still go to the primary model first
+            tier = "reasoning"
+        order = [tier, "fallback", "reasoning", "fast"]
+        seen, routes = set(), []
+        for name in order:
+            route = self.routes.get(name)
+            if route is not None and id(route.llm) not in seen:
+                seen.add(id(route.llm))
+                routes.append(route)
+        return routes
+
+    def next_healthy(self, candidates):
+        while candidates:
+            route = candidates.pop(0)
+            if route.breaker.allow():
+                return route
+        return None
+
+    def record(self, route, outcome):
+        """Count a call outcome; errors and missed deadlines count against the breaker.
+
+        Every launched call must end here exactly once, or a half-open
+        breaker would wait for its trial forever.
+        """
+        if outcome == "success":
+            route.breaker.record_success()
+        elif outcome == "cancelled":
+            route.breaker.release()
+        elif outcome in ("error", "timeout"):
+            route.failures += 1
+            if route.breaker.record_failure():
+                print(f"Circuit breaker opened for model route '{route.name}'")
+                METRICS.inc(METRICS.breaker_opens, route=route.name)
+        METRICS.inc(METRICS.model_calls, route=route.name, outcome=outcome)
+
+    async def astream(self, tier, messages, stop=None):
+        """Yield (route name, chunk) pairs from whichever candidate produces a token first"""
+        candidates = self.candidates(tier)
+        pending = {}
+        last_error = None
+
+        def launch():
+            route = self.next_healthy(candidates)
+            if route is None:
+                return False
+            route.calls += 1
+            # Explicit empty callbacks: only the routed model reports tokens to the trace
+            stream = route.llm.astream(messages, config={"callbacks": []}, stop=stop)
+            pending[asyncio.ensure_future(first_token(stream))] = (route, stream, time.monotonic())
+            return True
+
+        if not launch():
+            raise RuntimeError(f"No healthy model available for '{tier}' questions")
+        hedge_at = time.monotonic() + self.hedge_after
+        winner = None
+        try:
+            while pending and winner is None:
+                timeout = max(hedge_at - time.monotonic(), 0) if candidates else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Deadline passed with no token: hedge to the next model, keep the first one running
+                    if launch():
+                        self.hedged += 1
+                        METRICS.inc(METRICS.hedged_requests)
+                    hedge_at = time.monotonic() + self.hedge_after
+                    continue
+                for task in done:
+                    route, stream, _ = pending.pop(task)
+                    if task.exception() is None:
+                        winner = (route, stream, task.result())
+                        break
+                    last_error = task.exception()
+                    self.record(route, "error")
+                    await stream.aclose()
+                    print(f"Model route '{route.name}' failed: {str(last_error) or type(last_error).__name__}")
+                    # Fail over immediately rather than waiting for the hedge deadline
+                    if not pending:
+                        launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task, (route, stream, started) in pending.items():
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await stream.aclose()
+                missed_deadline = time.monotonic() - started >= self.hedge_after
+                self.record(route, "timeout" if missed_deadline else "cancelled")
+
+        if winner is None:
+            raise last_error or RuntimeError(f"No healthy model available for '{tier}' questions")
+
+        route, stream, prefix = winner
+        route.wins += 1
+        try:
+            for chunk in prefix:
+                yield route.name, chunk
+            async for chunk in stream:
+                yield route.name, chunk
+        except Exception:
+            self.record(route, "error")
+            raise
+        except BaseException:
+            # Timed out by the caller (CancelledError) or the consumer went away (GeneratorExit)
+            self.record(route, "cancelled")
+            raise
+        finally:
+            await stream.aclose()
+        self.record(route, "success")
+
+    def invoke(self, tier, messages, stop=None):
+        """Blocking failover without hedging, for the synchronous query path"""
+        candidates = self.candidates(tier)
+        last_error = None
+        while True:
+            route = self.next_healthy(candidates)
+            if route is None:
+                raise last_error or RuntimeError(f"No healthy model available for '{tier}' questions")
+            route.calls += 1
+            try:
+                message = route.llm.invoke(messages, stop=stop)
+            except Exception as e:
+                last_error = e
+                self.record(route, "error")
+                continue
+            except BaseException:
+                self.record(route, "cancelled")
+                raise
+            route.wins += 1
+            self.record(route, "success")
+            return route.name, message
+
+    def stats(self):
+        return {
+            "hedged": self.hedged,
+            "hedge_after_s": self.hedge_after,
+            "routes": {
+                name: {
+                    "model": getattr(route.llm, "model_name", None),
+                    "calls": route.calls,
+                    "wins": route.wins,
+                    "failures": route.failures,
+                    "breaker": route.breaker.state,
+                }
+                for name, route in self.routes.items()
+            },
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that delegates each call through a ModelRouter.
+
+    Bind the tier per request (`llm.bind(route="fast")`); unbound calls go to
+    the reasoning model. Tokens from the winning model are re-emitted as this
+    model's own callbacks, so timing traces see one LLM call.
+    """
+
+    router: ModelRouter
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self):
+        return "routed-chat"
+
+    async def _astream(self, messages, stop=None, run_manager=None, route="reasoning", **kwargs):
+        async for _, chunk in self.router.astream(route, messages, stop=stop):
+            generation = ChatGenerationChunk(message=AIMessageChunk(content=chunk.content))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, route="reasoning", **kwargs):
+        tokens = []
+        async for generation in self._astream(messages, stop=stop, run_manager=run_manager, route=route):
+            tokens.append(generation.message.content)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _generate(self, messages, stop=None, run_manager=None, route="reasoning", **kwargs):
+        _, message = self.router.invoke(route, messages, stop=stop)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=message.content))])
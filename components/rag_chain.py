@@ -1,110 +1,366 @@
 # components/rag_chain.py
-from langchain_openai import OpenAIEmbeddings
 from langchain_openai import ChatOpenAI
 # from langchain_anthropic import ChatAnthropic  # Only new import needed
 
 from langchain_community.vectorstores import Chroma
 from langchain.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+import asyncio
+import hashlib
+import random
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os  # Added for environment variable access
+from components.answer_cache import SharedAnswerCache
+from components.bm25_index import BM25Index, reciprocal_rank_fusion
+from components.context_packer import ContextPacker, estimate_tokens
+from components.embedding_scheduler import EmbeddingScheduler
+from components.embeddings import embed_with_headers, get_embedding_function
+from components.single_flight import SingleFlight, normalize_question
+from components.snapshot import load_manifest
+from components.source_filter import MEDICATION_SOURCE, plan_retrieval, plan_scope, where_clause
+from components.metrics import METRICS
+from components.model_router import ModelRouter, RoutedChatModel, classify_question
+from components.tracing import RequestTrace
+
+def openrouter_chat_model(model, max_tokens=6000, base_url=None, max_retries=2):
+    """ChatOpenAI client for an OpenRouter (or other OpenAI-compatible) model"""
+    return ChatOpenAI(
+        model=model,
+        max_retries=max_retries,
+        temperature=0.2,
+        max_tokens=max_tokens,
+        streaming=True,  # Token callbacks give time-to-first-token even for ainvoke
+        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
+        openai_api_base=base_url or os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+        default_headers={
+            "HTTP-Referer": "https://replit.com",
+            ## Replace with your real site
+            "X-Title": "Coeliac Disease Expert System"
+        }
+    )
+
+
+def build_model_router(reasoning_model):
+    """Router over the reasoning model plus the optional fast and fallback models; None if neither is set"""
+    fast_model = os.getenv("RAG_FAST_MODEL")
+    fallback_model = os.getenv("RAG_FALLBACK_MODEL")
+    if not fast_model and not fallback_model:
+        return None
+    # No client-side retries: a failing provider is handed to the next route instead
+    routes = {"reasoning": openrouter_chat_model(reasoning_model, max_retries=0)}
+    if fast_model:
+        routes["fast"] = openrouter_chat_model(
+            fast_model,
+            max_tokens=int(os.getenv("RAG_FAST_MAX_TOKENS", "2000")),
+            base_url=os.getenv("RAG_FAST_BASE_URL"),
+            max_retries=0
+        )
+    if fallback_model:
+        routes["fallback"] = openrouter_chat_model(
+            fallback_model, base_url=os.getenv("RAG_FALLBACK_BASE_URL"), max_retries=0
+        )
+    return ModelRouter(
+        routes,
+        hedge_after=float(os.getenv("RAG_HEDGE_AFTER", "20")),
+        failure_threshold=int(os.getenv("RAG_BREAKER_FAILURES", "3")),
+        reset_timeout=float(os.getenv("RAG_BREAKER_RESET", "60"))
+    )
+
 
 class RAGChain:
-    def __init__(self):
-        self.persist_directory = "./chroma_db"
+    def __init__(self, llm=None, embedding_function=None, persist_directory="./chroma_db",
+                 cache_dir=None, read_only=False):
+        """llm and embedding_function default to the OpenRouter and configured
+        embedding backends; benchmarks pass local stand-ins instead.
+
+        Caches live in cache_dir (default: next to the vector store). A
+        read_only chain serves a published snapshot: it never writes the
+        collection and shares its answer cache with other workers.
+        """
+        self.persist_directory = persist_directory
+        self.cache_dir = Path(cache_dir) if cache_dir else Path(persist_directory).parent
+        self.read_only = read_only
+        self.snapshot_version = None
         self.collection_name = "hepatology_docs"
-        # Only change is here - replacing ChatOpenAI with ChatAnthropic
-        self.llm = ChatOpenAI(
-            model="deepseek/deepseek-r1:free",  
+        # RAG_FAST_MODEL / RAG_FALLBACK_MODEL put a router in front of the reasoning model
+        self.model_router = None
+        if llm is None:
+            reasoning_model = os.getenv("RAG_REASONING_MODEL", "deepseek/deepseek-r1:free")
             #perplexity/r1-1776
             #google/gemini-2.0-flash-thinking-exp:free
-            #
-            
-            # The DeepSeek R1 1776 model
-            temperature=0.2,
-            max_tokens=6000,  # Note: changed from max_tokens_to_sample
-            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-            openai_api_base="https://openrouter.ai/api/v1",
-            default_headers={
-                "HTTP-Referer": "https://replit.com",
-                ## Replace with your real site
-                "X-Title": "Coeliac Disease Expert System"
-            }
-        )
+            self.model_router = build_model_router(reasoning_model)
+            if self.model_router:
+                llm = RoutedChatModel(router=self.model_router)
+            else:
+                llm = openrouter_chat_model(reasoning_model)
+        elif isinstance(llm, RoutedChatModel):
+            self.model_router = llm.router
+        self.llm = llm
         # self.llm = ChatAnthropic(
           #  model="claude-3-5-sonnet-20241022",
            # temperature=0.2,
             #max_tokens_to_sample=6000,  # Changed from max_tokens to max_tokens_to_sample for Claude          anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
         
-        self.embedding_function = OpenAIEmbeddings()  # Keep OpenAI embeddings
+        # OpenAI by default; RAG_EMBEDDINGS=local uses a CPU sentence-transformers model
+        self.embedding_function = embedding_function or get_embedding_function(self.cache_dir)
+        if embedding_function is None and os.getenv("RAG_EMBEDDINGS", "openai") != "openai":
+            # Vectors from different models are not comparable, keep them apart
+            model_slug = re.sub(r"[^A-Za-z0-9]+", "_", self.embedding_function.model).strip("_")
+            self.collection_name = f"{self.collection_name}_{model_slug}"[:63]
+        # Upstream call limits; one slow OpenRouter call must not stall the worker
+        self.max_retries = 3
+        self.retry_base_delay = float(os.getenv("RAG_RETRY_BASE_DELAY", "2"))
+        self.retry_max_delay = float(os.getenv("RAG_RETRY_MAX_DELAY", "30"))
+        self.request_timeout = float(os.getenv("RAG_REQUEST_TIMEOUT", "180"))
+        self.llm_semaphore = asyncio.Semaphore(int(os.getenv("RAG_MAX_CONCURRENCY", "4")))
+        # Identical in-flight questions share one retrieval + generation
+        self.single_flight = SingleFlight()
+        self.llm_calls = 0
+        # Bulk question sets (/query/batch): generation slots per job, on top of the global cap
+        self.batch_concurrency = int(os.getenv("RAG_BATCH_CONCURRENCY", "4"))
+
+        # Ingestion: large batches, several in flight, paced by the provider's rate-limit headers
+        self.embedding_scheduler = EmbeddingScheduler(
+            self.embed_texts_with_headers,
+            max_batch_inputs=int(os.getenv("RAG_EMBED_BATCH", "2048")),
+            concurrency=int(os.getenv("RAG_EMBED_CONCURRENCY", "4")),
+            requests_per_minute=int(os.getenv("RAG_EMBED_RPM", "3000")),
+            tokens_per_minute=int(os.getenv("RAG_EMBED_TPM", "1000000"))
+        )
+
+        self.search_kwargs = {
+            "k": 10,        # Number of documents to finally return
+            "fetch_k": 20,  # Number of initial candidates to fetch
+            "lambda_mult": 0.5  # 0.5 balances relevance and diversity
+        }
+
+        # Optional cross-encoder rerank: retrieve a wider pool, send the best top_n
+        self.reranker = None
+        if os.getenv("RAG_RERANK", "0") == "1":
+            from components.reranker import Reranker
+            self.reranker = Reranker(
+                os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                top_n=self.search_kwargs["k"],
+                latency_budget_ms=float(os.getenv("RAG_RERANK_BUDGET_MS", "500"))
+            )
+            candidates = int(os.getenv("RAG_RERANK_CANDIDATES", "30"))
+            self.search_kwargs = {**self.search_kwargs, "k": candidates, "fetch_k": candidates * 2}
+
+        # Source filtering: an explicit source list restricts the search to those sources,
+        # guideline names in a question boost them through an extra sub-retrieval, and
+        # medication questions get a separate MED-FDA lookup with its own k
+        self.auto_source_filter = os.getenv("RAG_AUTO_SOURCE_FILTER", "1") == "1"
+        self.boost_k = int(os.getenv("RAG_BOOST_K", "5"))
+        self.medication_k = int(os.getenv("RAG_MEDICATION_K", "4"))
+        self.sub_retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sub-retrieval")
+
+        # Keyword index for hybrid retrieval, fused with vector results via RRF
+        self.bm25_index = None
+        if os.getenv("RAG_HYBRID", "1") == "1":
+            self.bm25_index = BM25Index(
+                Path(self.persist_directory).parent / f"{self.collection_name}_bm25.json"
+            )
+        self.rrf_k = 60
+
+        # Merge overlapping chunks, drop near-duplicates and pack to a prompt token budget
+        self.context_packer = None
+        if os.getenv("RAG_CONTEXT_PACKING", "1") == "1":
+            self.context_packer = ContextPacker(token_budget=int(os.getenv("RAG_CONTEXT_TOKENS", "4000")))
+        self.template_tokens = 0
+
+        # Semantic answer cache; SQLite so writes are incremental and workers can share it
+        self.answer_cache = None
+        if os.getenv("RAG_ANSWER_CACHE", "1") == "1":
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.answer_cache = SharedAnswerCache(
+                self.cache_dir / "answer_cache.sqlite3",
+                threshold=float(os.getenv("RAG_CACHE_THRESHOLD", "0.95")),
+                max_entries=int(os.getenv("RAG_CACHE_MAX_ENTRIES", "500")),
+                ttl=float(os.getenv("RAG_CACHE_TTL", str(7 * 24 * 3600)))
+            )
+
         self.db = None
+        self.retriever = None
+        self.prompt = None
+        self.answer_chain = None
         self.qa_chain = None
+        # Reported by /ready while initialization runs in the background
+        self.progress = {"stage": "created", "embedded": 0, "removed": 0}
 
-    def collection_exists(self):
-        """Check if collection already exists"""
-        if not Path(self.persist_directory).exists():
-            return False
-        try:
-            db = Chroma(
+    @classmethod
+    def from_snapshot(cls, snapshot_path, cache_dir, **kwargs):
+        """Open a published index snapshot (see ingest.py) read-only"""
+        manifest = load_manifest(snapshot_path)
+        chain = cls(
+            persist_directory=str(Path(snapshot_path) / "chroma_db"),
+            cache_dir=cache_dir,
+            read_only=True,
+            **kwargs
+        )
+        if chain.collection_name != manifest["collection_name"]:
+            raise RuntimeError(
+                f"Snapshot {manifest['version']} holds collection {manifest['collection_name']}, "
+                f"but the configured embeddings use {chain.collection_name}"
+            )
+        chain.snapshot_version = manifest["version"]
+        return chain
+
+    def open_db(self):
+        """Open the persisted Chroma collection once and reuse it"""
+        if self.db is None:
+            self.db = Chroma(
                 persist_directory=self.persist_directory,
                 embedding_function=self.embedding_function,
                 collection_name=self.collection_name
             )
-            collection = db.get()
-            return collection['ids'] != []
+        return self.db
+
+    def vector_segment(self):
+        """Chroma's HNSW segment for the collection; loading it replays the embeddings log"""
+        from chromadb.segment import SegmentManager, VectorReader
+        manager = self.open_db()._client._system.instance(SegmentManager)
+        return manager.get_segment(self.db._collection.id, VectorReader)
+
+    def close(self):
+        """Release the Chroma client.
+
+        Chroma flushes the HNSW index only every `hnsw:sync_threshold` writes
+        and replays the rest of the embeddings log on every open; a writable
+        chain persists the index first so the next open has nothing to replay.
+        """
+        if self.db is None:
+            return
+        if not self.read_only:
+            segment = self.vector_segment()
+            if hasattr(segment, "_persist"):
+                segment._persist()
+        self.db._client._system.stop()
+        self.db._client.clear_system_cache()
+        self.db = None
+
+    def collection_exists(self):
+        """Check if collection already exists, using a count rather than reading documents"""
+        if not Path(self.persist_directory).exists():
+            return False
+        try:
+            return self.open_db()._collection.count() > 0
         except Exception:
             return False
 
+    def embed_texts_with_headers(self, texts):
+        """Embed texts in a single request, returning the vectors and the response headers"""
+        if hasattr(self.embedding_function, "embed_documents_with_headers"):
+            return self.embedding_function.embed_documents_with_headers(texts)
+        return embed_with_headers(self.embedding_function, texts)
+
+    def store_embedded(self, documents, embeddings):
+        """Write an embedded batch under its deterministic chunk ids"""
+        self.db._collection.upsert(
+            ids=[doc.metadata["chunk_id"] for doc in documents],
+            embeddings=embeddings,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents]
+        )
+        self.progress["embedded"] += len(documents)
+
+    def sync_documents(self, document_generator):
+        """Bring the collection in line with the processed documents.
+
+        Only chunks whose id (source + content hash) is not yet stored get
+        embedded. Stored chunks that no longer appear are deleted, but only
+        for sources that were processed in this pass, so a failed download
+        never wipes its guideline from the index. Ids without a source prefix
+        come from the old random-id build and are always replaced.
+
+        Every embedded batch is written as soon as it completes, so the
+        collection itself is the checkpoint: rerunning after an interruption
+        skips everything that was already stored.
+        """
+        existing_ids = set(self.db.get(include=[])["ids"])
+        seen_ids = set()
+        processed_sources = set()
+        keyword_changed = []
+
+        def pending_documents():
+            for batch in document_generator:
+                for doc in batch:
+                    chunk_id = doc.metadata["chunk_id"]
+                    processed_sources.add(doc.metadata.get("source", "Unknown"))
+                    if chunk_id in seen_ids:
+                        continue
+                    seen_ids.add(chunk_id)
+                    if self.bm25_index is not None and chunk_id not in self.bm25_index:
+                        self.bm25_index.add(chunk_id, doc.page_content, doc.metadata)
+                        keyword_changed.append(chunk_id)
+                    if chunk_id not in existing_ids:
+                        yield doc
+
+        added = self.embedding_scheduler.run(pending_documents(), self.store_embedded)
+
+        stale_ids = [
+            chunk_id for chunk_id in existing_ids - seen_ids
+            if ":" not in chunk_id or chunk_id.split(":", 1)[0] in processed_sources
+        ]
+        if stale_ids:
+            self.db.delete(ids=stale_ids)
+            self.progress["removed"] += len(stale_ids)
+
+        if self.bm25_index is not None:
+            keyword_stale = [
+                chunk_id for chunk_id in self.bm25_index.documents
+                if chunk_id not in seen_ids
+                and (":" not in chunk_id or chunk_id.split(":", 1)[0] in processed_sources)
+            ]
+            self.bm25_index.remove(keyword_stale)
+            if keyword_changed or keyword_stale:
+                self.bm25_index.save()
+
+        print(f"Sync complete: {added} added, {len(stale_ids)} removed, "
+              f"{len(seen_ids) - added} unchanged")
+        if added or stale_ids:
+            self.db.persist()
+
+    def rebuild_keyword_index(self, page_size=1000):
+        """Rebuild the BM25 index from the documents already stored in Chroma"""
+        print("Building keyword index from vector store...")
+        offset = 0
+        while True:
+            page = self.db.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                self.bm25_index.add(chunk_id, text, metadata or {})
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        if not self.read_only:
+            self.bm25_index.save()
+        print(f"Keyword index holds {len(self.bm25_index)} chunks")
+
     def initialize(self, document_generator):
-        """Initialize or load vector store with persistence"""
-        print("Checking for existing vector store...")
+        """Initialize or load vector store with persistence.
 
-        if self.collection_exists():
-            print("Loading existing vector store...")
-            self.db = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding_function,
-                collection_name=self.collection_name
-            )
-        else:
-            print("Creating new vector store...")
-            # Process first batch
-            first_batch = next(document_generator)
-            self.db = Chroma.from_documents(
-                first_batch[:100],
-                self.embedding_function,
-                persist_directory=self.persist_directory,
-                collection_name=self.collection_name
-            )
-            print("Processed initial 100 documents")
-            time.sleep(30)
-
-            # Process remaining documents
-            if len(first_batch) > 100:
-                self.db.add_documents(first_batch[100:])
-                print("Completed first batch")
-                time.sleep(30)
-
-            # Process remaining batches
-            for i, batch in enumerate(document_generator, 1):
-                print(f"Processing batch {i+1}...")
-                for j in range(0, len(batch), 100):
-                    chunk = batch[j:j+100]
-                    try:
-                        self.db.add_documents(chunk)
-                        print(f"Processed {len(chunk)} documents")
-                        time.sleep(70)
-                    except Exception as e:
-                        if "rate_limit" in str(e).lower():
-                            print("Rate limit hit, waiting 70 seconds...")
-                            time.sleep(70)
-                            self.db.add_documents(chunk)
-                print(f"Completed batch {i+1}")
-                # Persist after each batch
-                self.db.persist()
-                time.sleep(70)
+        When a document generator is given, the collection is synced against
+        it incrementally; pass None to just load what is already stored.
+        """
+        print("Loading vector store...")
+        self.progress["stage"] = "loading_vector_store"
+        self.open_db()
+
+        if document_generator is not None:
+            if self.read_only:
+                raise RuntimeError("Snapshots are immutable; run ingest.py to build a new one")
+            print("Syncing vector store with source documents...")
+            self.progress["stage"] = "syncing"
+            self.sync_documents(document_generator)
+
+        if self.bm25_index is not None and len(self.bm25_index) == 0:
+            self.progress["stage"] = "building_keyword_index"
+            self.rebuild_keyword_index()
+
+        self.progress["stage"] = "building_chain"
 
         # Set up retriever and chain
 #        retriever = self.db.as_retriever(
@@ -112,13 +368,10 @@ class RAGChain:
 #            search_kwargs={"k": 10}
 #        )
 
-        retriever = self.db.as_retriever(
-            search_type="mmr",
-            search_kwargs={
-                "k": 10,        # Number of documents to finally return
-                "fetch_k": 20,  # Number of initial candidates to fetch
-                "lambda_mult": 0.5  # 0.5 balances relevance and diversity
-            }
+        # MMR vector search, fused with BM25 keyword search when hybrid retrieval is on,
+        # filtered to any guideline the question names
+        retriever = RunnableLambda(
+            lambda question: self.retrieve(question, plan=self.plan_retrieval(question))[0]
         )
         # Your existing template
         template = """
@@ -179,17 +432,23 @@ class RAGChain:
         
         # Your existing template
         prompt = ChatPromptTemplate.from_template(template)
+        self.template_tokens = estimate_tokens(template)
+
+        # Keep retrieval and generation addressable on their own so the
+        # streaming path can send sources before the first token arrives
+        self.retriever = retriever
+        self.prompt = prompt
+        self.answer_chain = prompt | self.llm | StrOutputParser()
 
         self.qa_chain = (
             {
-                "context": retriever | self.format_documents,
+                "context": retriever | self.pack_documents | self.format_documents,
                 "question": RunnablePassthrough()
             }
-            | prompt
-            | self.llm
-            | StrOutputParser()
+            | self.answer_chain
         )
 
+        self.progress["stage"] = "ready"
         print("RAG chain setup complete!")
 
 #    @staticmethod
@@ -222,22 +481,476 @@ class RAGChain:
             formatted_docs.append(f"{source_name} (Reference: {source}):\n{doc.page_content}\n")
         return "\n".join(formatted_docs)
     
+    def pack_documents(self, documents):
+        """Context assembly stage between retrieval and format_documents"""
+        if not self.context_packer:
+            return documents
+        return self.context_packer.pack(documents)[0]
+
+    def build_context(self, question: str, documents):
+        """Pack and format retrieved documents, reporting prompt tokens before and after packing"""
+        packed, stats = documents, {}
+        if self.context_packer:
+            packed, stats = self.context_packer.pack(documents)
+        context = self.format_documents(packed)
+        question_tokens = estimate_tokens(question)
+        if self.context_packer:
+            stats["prompt_tokens_before"] = (
+                self.template_tokens + estimate_tokens(self.format_documents(documents)) + question_tokens
+            )
+        stats["prompt_tokens"] = self.template_tokens + estimate_tokens(context) + question_tokens
+        return packed, context, stats
+
+    @staticmethod
+    def describe_sources(documents):
+        """Summarize retrieved documents for the client before generation starts"""
+        return [
+            {
+                "source": doc.metadata.get("source", "Unknown"),
+                "preview": doc.page_content[:200]
+            }
+            for doc in documents
+        ]
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter for the given zero-based attempt"""
+        ceiling = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def collection_fingerprint(self):
+        """Cheap identifier that changes whenever the collection is written to"""
+        if self.snapshot_version:
+            return self.snapshot_version
+        sqlite_path = Path(self.persist_directory) / "chroma.sqlite3"
+        mtime = sqlite_path.stat().st_mtime if sqlite_path.exists() else 0
+        return f"{self.db._collection.count()}:{mtime}"
+
+    @staticmethod
+    def document_key(doc):
+        """Stable key for fusing result lists; legacy chunks fall back to a content hash"""
+        return doc.metadata.get("chunk_id") or hashlib.sha256(doc.page_content.encode()).hexdigest()
+
+    def plan_retrieval(self, question: str, sources=None):
+        """Source filter, boosted sources and MED-FDA lookup for a question"""
+        return plan_retrieval(question, sources, detect=self.auto_source_filter)
+
+    def retrieve_from(self, embedding, sources, k):
+        """Similarity sub-retrieval limited to sources, run alongside the main search"""
+        start = time.perf_counter()
+        documents = self.db.similarity_search_by_vector(embedding, k=k, filter=where_clause(sources))
+        return documents, (time.perf_counter() - start) * 1000
+
+    def retrieve(self, question: str, embedding=None, plan=None):
+        """Retrieve context documents, returning them with per-stage latencies in ms.
+
+        `plan` comes from plan_retrieval; without one the whole collection is
+        searched and no MED-FDA lookup runs. Boosted sources are searched
+        separately and fused into the ranking, never used as a filter.
+        """
+        timings = {}
+        sources = plan["sources"] if plan else []
+        boost_sources = plan.get("boost_sources", []) if plan else []
+        start = time.perf_counter()
+        if embedding is None:
+            embedding = self.embedding_function.embed_query(question)
+            timings["embed_ms"] = (time.perf_counter() - start) * 1000
+
+        medication = None
+        if plan and plan["medication_check"]:
+            medication = self.sub_retrieval_pool.submit(
+                self.retrieve_from, embedding, [MEDICATION_SOURCE], self.medication_k
+            )
+        boost = None
+        if boost_sources:
+            boost = self.sub_retrieval_pool.submit(self.retrieve_from, embedding, boost_sources, self.boost_k)
+
+        stage = time.perf_counter()
+        # Source filters are pushed down to Chroma as a metadata where clause
+        vector_docs = self.db.max_marginal_relevance_search_by_vector(
+            embedding, filter=where_clause(sources) if sources else None, **self.search_kwargs
+        )
+        timings["vector_ms"] = (time.perf_counter() - stage) * 1000
+
+        documents = vector_docs
+        keyword_hits = None
+        if self.bm25_index is not None:
+            stage = time.perf_counter()
+            keyword_hits = self.bm25_index.search(question, k=self.search_kwargs["fetch_k"], sources=sources)
+            timings["bm25_ms"] = (time.perf_counter() - stage) * 1000
+
+        boost_docs = None
+        if boost is not None:
+            boost_docs, timings["boost_ms"] = boost.result()
+
+        if keyword_hits is not None or boost_docs:
+            stage = time.perf_counter()
+            candidates = {self.document_key(doc): doc for doc in vector_docs}
+            rankings = [list(candidates)]
+            if keyword_hits is not None:
+                rankings.append([chunk_id for chunk_id, _ in keyword_hits])
+            if boost_docs:
+                # The named guideline's best chunks enter the fusion as one more ranked list
+                rankings.append([self.document_key(doc) for doc in boost_docs])
+                for doc in boost_docs:
+                    candidates.setdefault(self.document_key(doc), doc)
+            fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)[:self.search_kwargs["k"]]
+            documents = [
+                candidates[key] if key in candidates else self.bm25_index.get_document(key)
+                for key in fused
+            ]
+            timings["fusion_ms"] = (time.perf_counter() - stage) * 1000
+
+        if self.reranker is not None:
+            documents, rerank_stats = self.reranker.rerank(
+                question, documents, [self.document_key(doc) for doc in documents]
+            )
+            timings["rerank_ms"] = rerank_stats["rerank_ms"]
+            if rerank_stats["skipped_for_budget"]:
+                print(f"Rerank budget exhausted, {rerank_stats['skipped_for_budget']} candidates unscored")
+
+        if medication is not None:
+            medication_docs, timings["medication_ms"] = medication.result()
+            seen = {self.document_key(doc) for doc in documents}
+            extra = [doc for doc in medication_docs if self.document_key(doc) not in seen]
+            # MED-FDA hits take the tail slots, so the context size stays the same
+            documents = documents[:max(len(documents) - len(extra), 1)] + extra
+
+        return documents, timings
+
+    async def aretrieve(self, question: str, embedding=None, plan=None):
+        """Retrieve off the event loop, reusing a precomputed query embedding if available"""
+        return await asyncio.to_thread(self.retrieve, question, embedding, plan)
+
+    def record_llm_call(self):
+        self.llm_calls += 1
+        METRICS.inc(METRICS.llm_calls)
+
+    def answer_chain_for(self, question: str, trace):
+        """Answer chain for one question; with a model router, bound to the question's tier"""
+        if not self.model_router:
+            return self.answer_chain
+        tier = classify_question(question)
+        trace.annotate(model_route=tier)
+        return self.prompt | self.llm.bind(route=tier) | StrOutputParser()
+
+    async def agenerate(self, inputs, trace):
+        """Run the answer chain with a timeout and jittered retries; raises the last error.
+
+        With a model router there is a single attempt: the router has already
+        failed over between providers, and retrying would call each of them again.
+        """
+        config = {"callbacks": trace.callbacks}
+        answer_chain = self.answer_chain_for(inputs["question"], trace)
+        attempts = 1 if self.model_router else self.max_retries
+        for attempt in range(attempts):
+            try:
+                async with self.llm_semaphore:
+                    print(f"Processing query with LLM (attempt {attempt + 1})")
+                    self.record_llm_call()
+                    return await asyncio.wait_for(
+                        answer_chain.ainvoke(inputs, config=config),
+                        timeout=self.request_timeout
+                    )
+            except Exception as e:
+                error_msg = str(e) or type(e).__name__
+                if attempt == attempts - 1:
+                    print(f"Final error during query: {error_msg}")
+                    raise
+                wait_time = self.backoff_delay(attempt)
+                print(f"Error during query (attempt {attempt + 1}): {error_msg}")
+                print(f"Retrying in {wait_time:.1f} seconds...")
+                trace.retry()
+                await asyncio.sleep(wait_time)
+
+    async def acached_answer(self, question: str, scope=""):
+        """Embed the question and look it up in the answer cache.
+
+        Returns (embedding, entry); entry is None on a miss and both are None
+        when caching is disabled.
+        """
+        if not self.answer_cache:
+            return None, None
+        embedding = await self.embedding_function.aembed_query(question)
+        entry = await asyncio.to_thread(self.cache_lookup, embedding, scope)
+        return embedding, entry
+
+    def cache_lookup(self, embedding, scope=""):
+        """Answer cache lookup against the current collection; blocking (SQLite, file I/O)"""
+        return self.answer_cache.lookup(embedding, self.collection_fingerprint(), scope)
+
+    async def acache_store(self, question: str, embedding, answer, sources, scope=""):
+        """Store an answer without blocking the event loop on the cache write"""
+        await asyncio.to_thread(
+            lambda: self.answer_cache.store(question, embedding, answer, sources, self.collection_fingerprint(), scope)
+        )
+
+    @staticmethod
+    def flight_key(question: str, plan) -> str:
+        """Coalescing key: the same question under a different source filter is a different request"""
+        return f"{plan_scope(plan)}|{normalize_question(question)}"
+
+    async def aquery(self, question: str, sources=None) -> dict:
+        """Query the RAG system without blocking the event loop.
+
+        Returns a dict with the answer, its sources and whether it was served
+        from the answer cache. `sources` restricts retrieval to those
+        guidelines; otherwise guideline names in the question are used.
+        Concurrent identical questions share a single computation, including
+        one already being streamed to another client.
+        """
+        if not self.qa_chain:
+            raise ValueError("RAG chain not initialized! Please call initialize() first.")
+        plan = self.plan_retrieval(question, sources)
+        key = self.flight_key(question, plan)
+        if self.single_flight.streaming(key):
+            return await self.acollect_stream(key, question, plan)
+        return await self.single_flight.run(key, lambda: self._aquery(question, plan))
+
+    async def acollect_stream(self, key, question: str, plan) -> dict:
+        """Join the in-flight stream for key and assemble its events into an aquery result"""
+        result = {"answer": "", "sources": [], "cached": False, "filters": plan}
+        tokens = []
+        try:
+            async for event in self.single_flight.stream(key, lambda: self._astream_query(question, plan)):
+                if event["type"] == "sources":
+                    result.update(
+                        sources=event["sources"],
+                        timings=event.get("timings", {}),
+                        context=event.get("context", {}),
+                        filters=event.get("filters", plan)
+                    )
+                elif event["type"] == "token":
+                    tokens.append(event["content"])
+                elif event["type"] == "done":
+                    result["cached"] = event.get("cached", False)
+        except Exception as e:
+            result["answer"] = f"An error occurred while processing your question: {str(e) or type(e).__name__}"
+            return result
+        result["answer"] = "".join(tokens)
+        return result
+
+    async def _aquery(self, question: str, plan) -> dict:
+        """Cache lookup, retrieval and generation behind aquery"""
+        trace = RequestTrace.start("query")
+        trace.annotate(filters=plan)
+        scope = plan_scope(plan)
+        start = time.perf_counter()
+        embedding, cached = await self.acached_answer(question, scope)
+        if self.answer_cache:
+            trace.add_stages({"cache_lookup_ms": (time.perf_counter() - start) * 1000})
+            trace.cache_lookup(cached is not None)
+        if cached:
+            print("Serving answer from cache")
+            trace.finish(cached=True)
+            return {"answer": cached["answer"], "sources": cached["sources"], "cached": True, "filters": plan}
+
+        documents, timings = await self.aretrieve(question, embedding, plan)
+        trace.add_stages(timings)
+        documents, context, context_stats = self.build_context(question, documents)
+        trace.annotate(context=context_stats)
+        sources = self.describe_sources(documents)
+        inputs = {
+            "context": context,
+            "question": question
+        }
+
+        try:
+            answer = await self.agenerate(inputs, trace)
+        except Exception as e:
+            error_msg = str(e) or type(e).__name__
+            trace.finish(error=error_msg)
+            return {
+                "answer": f"An error occurred while processing your question: {error_msg}",
+                "sources": sources,
+                "cached": False,
+                "timings": timings,
+                "context": context_stats,
+                "filters": plan
+            }
+
+        if self.answer_cache:
+            await self.acache_store(question, embedding, answer, sources, scope)
+        trace.finish()
+        return {
+            "answer": answer,
+            "sources": sources,
+            "cached": False,
+            "timings": timings,
+            "context": context_stats,
+            "filters": plan
+        }
+
+    async def aquery_batch(self, items):
+        """Answer many questions, yielding one result dict per item as it finishes.
+
+        `items` are dicts with "id", "question" and a "plan" from
+        plan_retrieval. All questions are embedded in one call; each item
+        then retrieves and generates inside one of RAG_BATCH_CONCURRENCY
+        slots, so the first answers arrive while later items are still
+        waiting to be retrieved. Each item has its own retries. Results come
+        back in completion order, not input order.
+        """
+        if not self.qa_chain:
+            raise ValueError("RAG chain not initialized! Please call initialize() first.")
+        if not items:
+            return
+
+        start = time.perf_counter()
+        embeddings = await self.embedding_function.aembed_documents([item["question"] for item in items])
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        pending = []
+        scopes = [plan_scope(item["plan"]) for item in items]
+        cached_entries = [None] * len(items)
+        if self.answer_cache:
+            cached_entries = await asyncio.to_thread(
+                lambda: [self.cache_lookup(embedding, scope) for embedding, scope in zip(embeddings, scopes)]
+            )
+        for item, embedding, scope, cached in zip(items, embeddings, scopes, cached_entries):
+            if cached:
+                yield {
+                    "id": item["id"],
+                    "question": item["question"],
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "cached": True,
+                    "filters": item["plan"]
+                }
+            else:
+                pending.append((item, embedding, scope))
+
+        slots = asyncio.Semaphore(self.batch_concurrency)
+
+        async def answer(item, embedding, scope):
+            trace = RequestTrace.start("batch")
+            trace.annotate(filters=item["plan"], batch_id=item["id"])
+            result = {"id": item["id"], "question": item["question"], "cached": False, "filters": item["plan"]}
+            try:
+                async with slots:
+                    documents, timings = await self.aretrieve(item["question"], embedding, item["plan"])
+                    trace.add_stages({"batch_embed_ms": embed_ms, **timings})
+                    documents, context, context_stats = self.build_context(item["question"], documents)
+                    trace.annotate(context=context_stats)
+                    sources = self.describe_sources(documents)
+                    result.update(sources=sources, timings=timings, context=context_stats)
+                    result["answer"] = await self.agenerate(
+                        {"context": context, "question": item["question"]}, trace
+                    )
+            except Exception as e:
+                result["error"] = str(e) or type(e).__name__
+                trace.finish(error=result["error"])
+                return result
+            if self.answer_cache:
+                await self.acache_store(item["question"], embedding, result["answer"], sources, scope)
+            trace.finish()
+            return result
+
+        tasks = [asyncio.ensure_future(answer(item, embedding, scope)) for item, embedding, scope in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer went away (e.g. client disconnected): stop spending LLM calls
+            for task in tasks:
+                task.cancel()
+
+    async def astream_query(self, question: str, sources=None):
+        """Stream the answer token by token, yielding the retrieved sources first.
+
+        `sources` filters retrieval as in aquery. Concurrent identical
+        questions attach to one in-flight stream and every waiter receives
+        the same events. If a blocking aquery for the question is already
+        generating, its answer is awaited and sent as a single token event.
+        """
+        if not self.qa_chain:
+            raise ValueError("RAG chain not initialized! Please call initialize() first.")
+        plan = self.plan_retrieval(question, sources)
+        key = self.flight_key(question, plan)
+        if self.single_flight.running(key):
+            response = await self.single_flight.run(key, lambda: self._aquery(question, plan))
+            yield {
+                "type": "sources",
+                "sources": response["sources"],
+                "timings": response.get("timings", {}),
+                "context": response.get("context", {}),
+                "filters": response.get("filters", plan)
+            }
+            yield {"type": "token", "content": response["answer"]}
+            yield {"type": "done", "cached": response["cached"]}
+            return
+        async for event in self.single_flight.stream(key, lambda: self._astream_query(question, plan)):
+            yield event
+
+    async def _astream_query(self, question: str, plan):
+        """Cache lookup, retrieval and streamed generation behind astream_query"""
+        trace = RequestTrace.start("stream")
+        trace.annotate(filters=plan)
+        scope = plan_scope(plan)
+        start = time.perf_counter()
+        embedding, cached = await self.acached_answer(question, scope)
+        if self.answer_cache:
+            trace.add_stages({"cache_lookup_ms": (time.perf_counter() - start) * 1000})
+            trace.cache_lookup(cached is not None)
+        if cached:
+            trace.finish(cached=True)
+            yield {"type": "sources", "sources": cached["sources"], "filters": plan}
+            yield {"type": "token", "content": cached["answer"]}
+            yield {"type": "done", "cached": True}
+            return
+
+        documents, timings = await self.aretrieve(question, embedding, plan)
+        trace.add_stages(timings)
+        documents, context, context_stats = self.build_context(question, documents)
+        trace.annotate(context=context_stats)
+        sources = self.describe_sources(documents)
+        yield {
+            "type": "sources",
+            "sources": sources,
+            "timings": timings,
+            "context": context_stats,
+            "filters": plan
+        }
+
+        inputs = {
+            "context": context,
+            "question": question
+        }
+        answer_chain = self.answer_chain_for(question, trace)
+        tokens = []
+        try:
+            async with self.llm_semaphore:
+                self.record_llm_call()
+                async for token in answer_chain.astream(inputs, config={"callbacks": trace.callbacks}):
+                    if token:
+                        tokens.append(token)
+                        yield {"type": "token", "content": token}
+        except Exception as e:
+            trace.finish(error=str(e) or type(e).__name__)
+            raise
+
+        if self.answer_cache:
+            await self.acache_store(question, embedding, "".join(tokens), sources, scope)
+        trace.finish()
+        yield {"type": "done", "cached": False}
+
     def query(self, question: str) -> str:
         """Query the RAG system with error handling and retries"""
         if not self.qa_chain:
             raise ValueError("RAG chain not initialized! Please call initialize() first.")
 
-        max_retries = 3
-        for attempt in range(max_retries):
+        # The model router fails over itself, as in agenerate
+        attempts = 1 if self.model_router else self.max_retries
+        for attempt in range(attempts):
             try:
                 print(f"Processing query with LLM (attempt {attempt + 1})")
+                self.record_llm_call()
                 response = self.qa_chain.invoke(question)
                 return response
             except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 30
+                if attempt < attempts - 1:
+                    wait_time = self.backoff_delay(attempt)
                     print(f"Error during query (attempt {attempt + 1}): {str(e)}")
-                    print(f"Retrying in {wait_time} seconds...")
+                    print(f"Retrying in {wait_time:.1f} seconds...")
                     time.sleep(wait_time)
                 else:
                     error_msg = str(e)
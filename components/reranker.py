@@ -0,0 +1,81 @@
+# components/reranker.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class Reranker:
+    """Local CPU cross-encoder that re-scores a wide candidate pool.
+
+    Candidates are scored in batches in their retrieval order. Scores are
+    cached per (query, chunk id), so repeated questions skip the model. If the
+    latency budget runs out, the remaining candidates keep their retrieval
+    order behind the scored ones.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", top_n=10,
+                 batch_size=16, latency_budget_ms=500, cache_size=20000):
+        # Deferred import: torch is only loaded when reranking is enabled
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _cached(self, key):
+        with self.lock:
+            score = self.cache.get(key)
+            if score is not None:
+                self.cache.move_to_end(key)
+            return score
+
+    def _store(self, keys, scores):
+        with self.lock:
+            for key, score in zip(keys, scores):
+                self.cache[key] = float(score)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def rerank(self, query, documents, keys):
+        """Return (top documents, stats); keys are stable chunk ids aligned with documents"""
+        start = time.perf_counter()
+        query_key = " ".join(query.lower().split())
+        scores = {}
+        pending = []
+        for i, key in enumerate(keys):
+            score = self._cached((query_key, key))
+            if score is None:
+                pending.append(i)
+            else:
+                scores[i] = score
+        cached = len(scores)
+
+        skipped = 0
+        for offset in range(0, len(pending), self.batch_size):
+            if (time.perf_counter() - start) * 1000 > self.latency_budget_ms:
+                skipped = len(pending) - offset
+                break
+            batch = pending[offset:offset + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, documents[i].page_content) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            self._store([(query_key, keys[i]) for i in batch], batch_scores)
+            scores.update(zip(batch, (float(score) for score in batch_scores)))
+
+        scored = sorted(scores, key=scores.get, reverse=True)
+        unscored = [i for i in range(len(documents)) if i not in scores]
+        order = (scored + unscored)[:self.top_n]
+        stats = {
+            "candidates": len(documents),
+            "cached_scores": cached,
+            "scored": len(scores) - cached,
+            "skipped_for_budget": skipped,
+            "rerank_ms": (time.perf_counter() - start) * 1000,
+        }
+        return [documents[i] for i in order], stats
@@ -0,0 +1,102 @@
+# components/single_flight.py
+import asyncio
+
+
+def normalize_question(question):
+    """Case- and whitespace-insensitive key for identical questions"""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+class _Broadcast:
+    """Events produced by one in-flight stream, replayed to every subscriber"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self.changed = asyncio.Condition()
+
+
+class SingleFlight:
+    """Coalesce concurrent identical requests onto one in-flight computation.
+
+    `run` shares the result of a coroutine; `stream` shares the events of an
+    async generator, so late subscribers first replay what was already
+    produced and then receive new events as they arrive. The computation runs
+    in its own task, so one client disconnecting never cancels it for the
+    others. The two maps are separate; callers that want a blocking request
+    to join an in-flight stream (or the reverse) check `running`/`streaming`.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.broadcasts = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        task = self.tasks.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self.tasks[key] = task
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _pump(self, key, broadcast, factory):
+        try:
+            async for event in factory():
+                async with broadcast.changed:
+                    broadcast.events.append(event)
+                    broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            self.broadcasts.pop(key, None)
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
+
+    async def stream(self, key, factory):
+        broadcast = self.broadcasts.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = _Broadcast()
+            self.broadcasts[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+        else:
+            self.coalesced += 1
+
+        position = 0
+        while True:
+            async with broadcast.changed:
+                while position >= len(broadcast.events) and not broadcast.done:
+                    await broadcast.changed.wait()
+                pending = broadcast.events[position:]
+                finished = broadcast.done
+            for event in pending:
+                yield event
+            position += len(pending)
+            if finished and position >= len(broadcast.events):
+                break
+
+        if broadcast.error is not None:
+            raise broadcast.error
+
+    def running(self, key):
+        """True while a `run` computation for key is in flight"""
+        return key in self.tasks
+
+    def streaming(self, key):
+        """True while a `stream` computation for key is in flight"""
+        return key in self.broadcasts
+
+    def stats(self):
+        return {
+            "in_flight": len(self.tasks) + len(self.broadcasts),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
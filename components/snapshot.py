@@ -0,0 +1,106 @@
+# components/snapshot.py
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+from pathlib import Path
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+def current_snapshot(snapshot_dir):
+    """Path of the published snapshot CURRENT points at, or None before the first ingest"""
+    pointer = Path(snapshot_dir) / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    path = Path(snapshot_dir) / pointer.read_text().strip()
+    if not (path / MANIFEST_FILE).exists():
+        raise RuntimeError(f"{pointer} points at {path}, which is not a complete snapshot")
+    return path
+
+
+def load_manifest(snapshot_path):
+    with open(Path(snapshot_path) / MANIFEST_FILE, 'r') as f:
+        return json.load(f)
+
+
+def tree_digest(path):
+    """sha256 of every file under path, keyed by relative path"""
+    path = Path(path)
+    digests = {}
+    for file in sorted(p for p in path.rglob("*") if p.is_file()):
+        digest = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digests[str(file.relative_to(path))] = digest.hexdigest()
+    return digests
+
+
+def set_read_only(path, read_only=True):
+    """Drop (or restore) write permission on every file and directory under path"""
+    write_bits = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            entry = os.path.join(root, name)
+            mode = os.stat(entry).st_mode
+            os.chmod(entry, mode & ~write_bits if read_only else mode | stat.S_IWUSR)
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode & ~write_bits if read_only else mode | stat.S_IWUSR)
+
+
+def remove_tree(path):
+    """rmtree that also removes published (read-only) snapshots"""
+    if Path(path).exists():
+        set_read_only(path, read_only=False)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def new_version():
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+
+
+def staging_path(snapshot_dir, version, base=None):
+    """Directory to build the next snapshot in, seeded with a copy of `base` if given.
+
+    Copying the previous snapshot means the build only embeds chunks that
+    changed since then, while the published one stays untouched.
+    """
+    staging = Path(snapshot_dir) / f".build-{version}"
+    remove_tree(staging)
+    if base is not None:
+        shutil.copytree(base, staging, ignore=shutil.ignore_patterns(MANIFEST_FILE))
+        # The copy keeps the published snapshot's read-only modes
+        set_read_only(staging, read_only=False)
+    else:
+        staging.mkdir(parents=True)
+    return staging
+
+
+def publish(snapshot_dir, staging, manifest, keep=3):
+    """Move a finished build into place, make it read-only and atomically repoint CURRENT at it.
+
+    Workers that already opened an older snapshot keep reading it; they pick
+    up the new one on restart. Only the newest `keep` snapshots are retained.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    final = snapshot_dir / manifest["version"]
+    with open(staging / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(staging, final)
+    set_read_only(final)
+
+    tmp_pointer = snapshot_dir / f"{CURRENT_FILE}.tmp"
+    tmp_pointer.write_text(manifest["version"] + "\n")
+    os.replace(tmp_pointer, snapshot_dir / CURRENT_FILE)
+
+    published = sorted(
+        path for path in snapshot_dir.iterdir()
+        if path.is_dir() and (path / MANIFEST_FILE).exists()
+    )
+    for old in published[:-keep] if keep > 0 else []:
+        remove_tree(old)
+    return final
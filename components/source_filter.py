@@ -0,0 +1,84 @@
+# components/source_filter.py
+import re
+
+# Guideline sources as stored in chunk metadata, with the names questions use for them
+SOURCE_PATTERNS = {
+    "ACG": re.compile(r"\bACG\b|American College of Gastroenterology", re.IGNORECASE),
+    "BSG": re.compile(r"\bBSG\b|British Society of Gastroenterology", re.IGNORECASE),
+    "ESsCD": re.compile(r"\bESsCD\b|European Society for (?:the Study of )?Coeliac", re.IGNORECASE),
+    # Only the explicit label: "FDA-approved ..." is not a request for the MED-FDA document
+    "MED-FDA": re.compile(r"\bMED-FDA\b", re.IGNORECASE),
+}
+SOURCES = tuple(SOURCE_PATTERNS)
+MEDICATION_SOURCE = "MED-FDA"
+
+# Drugs used in coeliac disease and its complications whose names no suffix below catches
+MEDICATION_NAMES = (
+    "dapsone", "cyclosporine", "ciclosporin", "cyclosporin", "cladribine", "thioguanine", "tioguanine",
+    "tacrolimus", "mesalamine", "levothyroxine", "metformin", "insulin", "warfarin",
+    "larazotide", "latiglutenase",
+)
+
+# Cheap cue for the MED-FDA safety lookup: medication vocabulary, known drug names or common
+# drug-name endings. Suffixes need a real stem and are specific enough not to hit everyday words
+# ("magazine", "April")
+MEDICATION_PATTERN = re.compile(
+    r"\b(?:medications?|medicines?|drugs?|doses?|dosing|dosage|tablets?|capsules?|prescri\w*|"
+    r"contraindicat\w*|side[- ]effects?|interactions?|adverse|supplements?|steroids?|"
+    + "|".join(MEDICATION_NAMES) + "|"
+    r"\w{2,}(?:isone|olone|asone|onide|oprine|opurine|trexate|promazine|perazine|alazine|olol|sartan|"
+    r"statin|prazole|imab|umab|cillin|mycin|cycline|floxacin)|\w{3,}pril)\b",
+    re.IGNORECASE
+)
+
+
+def detect_sources(question):
+    """Guideline sources named in the question, in SOURCES order"""
+    return [source for source, pattern in SOURCE_PATTERNS.items() if pattern.search(question)]
+
+
+def mentions_medication(question):
+    return MEDICATION_PATTERN.search(question) is not None
+
+
+def validate_sources(sources):
+    """Return sources de-duplicated in SOURCES order; raise ValueError on unknown names"""
+    unknown = [source for source in sources if source not in SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown sources: {', '.join(unknown)}. Expected any of: {', '.join(SOURCES)}")
+    return [source for source in SOURCES if source in sources]
+
+
+def where_clause(sources):
+    """Chroma metadata filter restricting a search to the given sources"""
+    if len(sources) == 1:
+        return {"source": sources[0]}
+    return {"source": {"$in": list(sources)}}
+
+
+def plan_retrieval(question, sources=None, detect=True):
+    """Decide which sources the main search is limited to, which get boosted, and whether the MED-FDA lookup runs.
+
+    Explicit `sources` (from the request) are an exclusive filter. Guideline
+    names found in the question (when `detect` is set) only boost those
+    sources with an extra sub-retrieval: the prompt asks for the named
+    guideline first but still wants relevant details from the others. The
+    medication lookup runs whenever the question looks medication-related
+    and the main search isn't already limited to MED-FDA.
+    """
+    selected = validate_sources(sources) if sources else []
+    boosted = detect_sources(question) if detect and not selected else []
+    return {
+        "sources": selected,
+        "boost_sources": boosted,
+        "auto_detected": bool(boosted),
+        "medication_check": mentions_medication(question) and selected != [MEDICATION_SOURCE],
+    }
+
+
+def plan_scope(plan):
+    """Key separating cached or coalesced answers retrieved under different filters or boosts"""
+    scope = ",".join(plan["sources"])
+    if plan.get("boost_sources"):
+        scope += "~" + ",".join(plan["boost_sources"])
+    return scope
@@ -0,0 +1,244 @@
+# components/tracing.py
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from components.metrics import METRICS
+
+_log_queue = queue.Queue()
+_log_writer = None
+_log_lock = threading.Lock()
+
+
+def _write_log_lines():
+    """Background writer: appends queued (path, line) records, batching whatever is waiting"""
+    while True:
+        item = _log_queue.get()
+        if item is None:
+            return
+        batch = [item]
+        while True:
+            try:
+                item = _log_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                _log_queue.put(None)
+                break
+            batch.append(item)
+        by_path = {}
+        for path, line in batch:
+            by_path.setdefault(path, []).append(line)
+        for path, lines in by_path.items():
+            try:
+                with open(path, 'a') as f:
+                    f.writelines(lines)
+            except OSError as e:
+                print(f"Could not write timing log {path}: {str(e)}")
+
+
+def _flush_log():
+    if _log_writer is not None:
+        _log_queue.put(None)
+        _log_writer.join(timeout=5)
+
+
+def append_log(path, record):
+    """Queue one JSON line for the timing log; the file is written off the event loop"""
+    global _log_writer
+    with _log_lock:
+        if _log_writer is None:
+            _log_writer = threading.Thread(target=_write_log_lines, name="timing-log", daemon=True)
+            _log_writer.start()
+            atexit.register(_flush_log)
+    _log_queue.put((path, json.dumps(record) + "\n"))
+
+
+class NullTrace:
+    """Stand-in used when metrics are disabled; every hook is a no-op"""
+
+    callbacks = []
+
+    def add_stages(self, timings):
+        pass
+
+    def annotate(self, **fields):
+        pass
+
+    def retry(self):
+        pass
+
+    def cache_lookup(self, hit):
+        pass
+
+    def finish(self, cached=False, error=None):
+        pass
+
+
+class RequestTrace(BaseCallbackHandler):
+    """Timing trace for one request.
+
+    Passed as a callback to the answer chain, it times every runnable
+    (prompt formatting, the LLM call, output parsing) plus time to first
+    token, token throughput and prompt size. `finish` feeds the histograms
+    behind /metrics and queues one JSON line for the timing log, which a
+    background thread appends.
+    """
+
+    # Called on the event loop thread instead of an executor, so timestamps are exact
+    run_inline = True
+
+    def __init__(self, endpoint, metrics=METRICS, log_path=None):
+        self.endpoint = endpoint
+        self.metrics = metrics
+        self.log_path = log_path
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.annotations = {}
+        self.runnables = {}
+        self.run_starts = {}
+        self.retries = 0
+        self.cache_hit = None
+        self.llm_start = None
+        self.first_token = None
+        self.llm_end = None
+        self.streamed_tokens = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+
+    @classmethod
+    def start(cls, endpoint):
+        if not METRICS.enabled:
+            return NullTrace()
+        return cls(endpoint, log_path=os.getenv("RAG_TIMING_LOG", "./request_timings.jsonl") or None)
+
+    @property
+    def callbacks(self):
+        return [self]
+
+    @staticmethod
+    def run_name(serialized, kwargs):
+        if kwargs.get("name"):
+            return kwargs["name"]
+        serialized = serialized or {}
+        return serialized.get("name") or (serialized.get("id") or ["unknown"])[-1]
+
+    # Chain-level hooks: one timing per runnable in the answer chain
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        self.run_starts[run_id] = (self.run_name(serialized, kwargs), time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_run(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_run(run_id)
+
+    def _end_run(self, run_id):
+        started = self.run_starts.pop(run_id, None)
+        if started:
+            name, start = started
+            self.runnables[name] = self.runnables.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    # LLM hooks: time to first token, throughput and token counts
+    def _start_llm(self):
+        # A retry reuses the trace: report the attempt that produced the answer
+        self.llm_start = time.perf_counter()
+        self.first_token = None
+        self.llm_end = None
+        self.streamed_tokens = 0
+        self.completion_tokens = None
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.on_chain_start(serialized, None, run_id=run_id, **kwargs)
+        self._start_llm()
+        text = "".join(str(message.content) for batch in messages for message in batch)
+        self.prompt_tokens = len(text) // 4
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.on_chain_start(serialized, None, run_id=run_id, **kwargs)
+        self._start_llm()
+        self.prompt_tokens = sum(len(prompt) for prompt in prompts) // 4
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.streamed_tokens += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end_run(run_id)
+        self.llm_end = time.perf_counter()
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.prompt_tokens = usage.get("prompt_tokens", self.prompt_tokens)
+        self.completion_tokens = usage.get("completion_tokens")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end_run(run_id)
+        self.llm_end = time.perf_counter()
+
+    # Hooks called directly by RAGChain
+    def add_stages(self, timings):
+        self.stages.update(timings)
+
+    def annotate(self, **fields):
+        """Attach extra per-request details to the timing log record"""
+        self.annotations.update(fields)
+
+    def retry(self):
+        self.retries += 1
+
+    def cache_lookup(self, hit):
+        self.cache_hit = hit
+
+    def finish(self, cached=False, error=None):
+        total = time.perf_counter() - self.started
+        metrics = self.metrics
+        metrics.observe(metrics.request_seconds, total, endpoint=self.endpoint, cached=str(cached).lower())
+        for stage, value in self.stages.items():
+            metrics.observe(metrics.retrieval_ms, value, stage=stage.replace("_ms", ""))
+        for name, value in self.runnables.items():
+            metrics.observe(metrics.runnable_ms, value, runnable=name)
+        if self.cache_hit is not None:
+            metrics.inc(metrics.cache_lookups, result="hit" if self.cache_hit else "miss")
+        if self.retries:
+            metrics.inc(metrics.retries, self.retries)
+
+        record = {
+            "timestamp": time.time(),
+            "endpoint": self.endpoint,
+            "cached": cached,
+            "total_ms": total * 1000,
+            "retrieval_ms": self.stages,
+            "runnables_ms": self.runnables,
+            "retries": self.retries,
+            "error": str(error) if error else None,
+            **self.annotations,
+        }
+        if self.llm_start is not None:
+            llm_end = self.llm_end or time.perf_counter()
+            # Without streaming callbacks the first token arrives with the whole answer
+            first_token = self.first_token or llm_end
+            completion_tokens = self.completion_tokens or self.streamed_tokens
+            generation = llm_end - self.llm_start
+            record.update(
+                ttft_ms=(first_token - self.llm_start) * 1000,
+                generation_ms=generation * 1000,
+                prompt_tokens=self.prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+            metrics.observe(metrics.ttft_seconds, first_token - self.llm_start)
+            metrics.observe(metrics.generation_seconds, generation)
+            if self.prompt_tokens:
+                metrics.observe(metrics.prompt_tokens, self.prompt_tokens)
+            decode_time = llm_end - first_token
+            if completion_tokens and decode_time > 0:
+                record["tokens_per_second"] = completion_tokens / decode_time
+                metrics.observe(metrics.tokens_per_second, record["tokens_per_second"])
+
+        if self.log_path:
+            append_log(self.log_path, record)
+        return record
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# ingest.py
+"""Build and publish an immutable, versioned index snapshot for read-only workers.
+
+Fetches and chunks the guideline sources, syncs them into a copy of the
+current snapshot (so only new or changed chunks are embedded), flushes the
+vector index and checks that reopening it writes nothing, then writes a
+manifest, makes the tree read-only and atomically repoints
+<snapshot-dir>/CURRENT at the result.
+Servers started with RAG_SNAPSHOT_DIR pointing at the same directory serve
+it; restart them to pick up a new version.
+
+    python ingest.py --snapshot-dir ./index_snapshots
+    RAG_SNAPSHOT_DIR=./index_snapshots RAG_WORKERS=4 python main.py
+"""
+import argparse
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from components.snapshot import (current_snapshot, load_manifest, new_version, publish, remove_tree,
+                                 staging_path, tree_digest)
+
+
+def verify_unchanged_on_open(staging, cache_dir):
+    """Open the build the way a worker does and fail if that writes to any file.
+
+    Published snapshots are read-only, so whatever Chroma would still write
+    on open (an unflushed log replay) has to be caught before publishing.
+    """
+    from components.rag_chain import RAGChain
+
+    before = tree_digest(staging)
+    reader = RAGChain(persist_directory=str(staging / "chroma_db"), cache_dir=cache_dir, read_only=True)
+    reader.vector_segment()
+    reader.close()
+    after = tree_digest(staging)
+    changed = sorted(path for path in before.keys() | after.keys() if before.get(path) != after.get(path))
+    if changed:
+        raise RuntimeError(f"Opening the snapshot modified {', '.join(changed)}; refusing to publish")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot-dir", default="./index_snapshots")
+    parser.add_argument("--cache-dir", help="embedding cache location (default: the snapshot dir)")
+    parser.add_argument("--keep", type=int, default=3, help="published snapshots to retain")
+    parser.add_argument("--full", action="store_true", help="start from an empty index instead of the current one")
+    args = parser.parse_args()
+    load_dotenv()
+
+    from components.data_processor import DataProcessor
+    from components.rag_chain import RAGChain
+
+    snapshot_dir = Path(args.snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    base = None if args.full else current_snapshot(snapshot_dir)
+    version = new_version()
+    staging = staging_path(snapshot_dir, version, base)
+    print(f"Building snapshot {version}" + (f" from {base.name}" if base else " from scratch"))
+
+    start = time.perf_counter()
+    try:
+        rag_chain = RAGChain(
+            persist_directory=str(staging / "chroma_db"),
+            cache_dir=args.cache_dir or snapshot_dir
+        )
+        data_processor = DataProcessor()
+        # Every source is chunked: the sync needs the full id set to drop stale chunks
+        rag_chain.initialize(data_processor.process_documents())
+        rag_chain.db.persist()
+        chunks = rag_chain.db._collection.count()
+        manifest = {
+            "version": version,
+            "created_at": time.time(),
+            "previous": load_manifest(base)["version"] if base else None,
+            "collection_name": rag_chain.collection_name,
+            "embedding_model": getattr(rag_chain.embedding_function, "model", None),
+            "chunks": chunks,
+            "added": rag_chain.progress["embedded"],
+            "removed": rag_chain.progress["removed"],
+            "sources": sorted({data_processor.source_for_url(url) for url in data_processor.urls})
+        }
+        # Flush the HNSW index so opening the snapshot replays nothing, then check that it doesn't
+        rag_chain.close()
+        verify_unchanged_on_open(staging, args.cache_dir or snapshot_dir)
+    except BaseException:
+        remove_tree(staging)
+        raise
+
+    # No mark_ingested(): the document cache's ingested markers describe the collections in
+    # ./chroma_db, and a snapshot is always built from every source anyway
+    final = publish(snapshot_dir, staging, manifest, keep=args.keep)
+    print(f"Published {final} ({chunks} chunks, {manifest['added']} embedded, "
+          f"{manifest['removed']} removed) in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
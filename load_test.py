@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# load_test.py
+"""Fire N simultaneous clients at a running server and check they overlap.
+
+If /query blocked the event loop, wall time would approach the sum of all
+request latencies and /health would stall behind them. With the async path
+the concurrency factor (sum of latencies / wall time) should approach
+min(N, RAG_MAX_CONCURRENCY) and /health should stay fast.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def timed_post(session, url, question):
+    start = time.perf_counter()
+    response = session.post(url, json={"text": question}, timeout=600)
+    elapsed = time.perf_counter() - start
+    return start, elapsed, response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for POST /query")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--question", default="How is seronegative coeliac disease diagnosed?")
+    args = parser.parse_args()
+
+    query_url = f"{args.url}/query"
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.clients + 1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        futures = [
+            pool.submit(timed_post, session, query_url, f"{args.question} (client {i})")
+            for i in range(args.clients)
+        ]
+
+        # Probe /health while the queries are in flight
+        time.sleep(0.5)
+        health_start = time.perf_counter()
+        session.get(f"{args.url}/health", timeout=60)
+        health_latency = time.perf_counter() - health_start
+
+        results = [f.result() for f in futures]
+    wall_time = time.perf_counter() - wall_start
+
+    latencies = sorted(elapsed for _, elapsed, _ in results)
+    errors = sum(1 for _, _, status in results if status != 200)
+    concurrency = sum(latencies) / wall_time if wall_time else 0.0
+
+    print(f"Clients: {args.clients}, errors: {errors}")
+    print(f"Wall time: {wall_time:.2f}s, sum of latencies: {sum(latencies):.2f}s")
+    print(f"Latency min/median/max: {latencies[0]:.2f}s / "
+          f"{latencies[len(latencies) // 2]:.2f}s / {latencies[-1]:.2f}s")
+    print(f"Effective concurrency: {concurrency:.2f}")
+    print(f"/health latency under load: {health_latency * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
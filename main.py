@@ -1,40 +1,94 @@
 # main.py
 import os
+import json
+import time
+import asyncio
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from components.data_processor import DataProcessor
-from components.rag_chain import RAGChain
+from typing import List, Optional
+from components.batch import BatchJournal, parse_batch, run_batch
+from components.metrics import METRICS
+from components.snapshot import current_snapshot
+from components.source_filter import validate_sources
 
 # Load environment variables
 load_dotenv()
 
 # Verify environment variables
 # required_vars = ['OPENAI_API_KEY', 'ANTHROPIC_API_KEY']
-required_vars = ['OPENAI_API_KEY', 'OPENROUTER_API_KEY']
+required_vars = ['OPENROUTER_API_KEY']
+if os.getenv("RAG_EMBEDDINGS", "openai") == "openai":
+    required_vars.append('OPENAI_API_KEY')
 missing_vars = [var for var in required_vars if not os.getenv(var)]
 if missing_vars:
     raise RuntimeError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
-# Initialize components
-data_processor = DataProcessor()
-rag_chain = RAGChain()
+# Components are created by a background task so the server listens immediately;
+# langchain and chromadb are only imported there
+data_processor = None
+rag_chain = None
+init_state = {"status": "starting", "started_at": time.time(), "ready_at": None, "error": None, "snapshot": None}
+
+# With RAG_SNAPSHOT_DIR set, workers serve the snapshot published by ingest.py read-only
+# and never fetch or embed documents themselves; this is required for RAG_WORKERS > 1
+SNAPSHOT_DIR = os.getenv("RAG_SNAPSHOT_DIR")
+
+def open_snapshot():
+    """Open the current published snapshot; runs in a worker thread"""
+    global rag_chain
+    from components.rag_chain import RAGChain
+
+    snapshot = current_snapshot(SNAPSHOT_DIR)
+    if snapshot is None:
+        raise RuntimeError(f"No snapshot published in {SNAPSHOT_DIR}; run ingest.py first")
+    rag_chain = RAGChain.from_snapshot(snapshot, cache_dir=os.getenv("RAG_CACHE_DIR", SNAPSHOT_DIR))
+    rag_chain.initialize(None)
+    init_state["snapshot"] = rag_chain.snapshot_version
+
+def initialize_rag():
+    """Build the RAG components; runs in a worker thread"""
+    global data_processor, rag_chain
+    try:
+        if SNAPSHOT_DIR:
+            open_snapshot()
+            init_state.update(status="ready", ready_at=time.time())
+            print(f"Serving index snapshot {init_state['snapshot']}")
+            return
+
+        from components.data_processor import DataProcessor
+        from components.rag_chain import RAGChain
+
+        data_processor = DataProcessor()
+        rag_chain = RAGChain()
+        # Incremental: unchanged sources are skipped, only new or changed chunks are embedded
+        documents = data_processor.process_documents(
+            only_changed_in=rag_chain.collection_name if rag_chain.collection_exists() else None
+        )
+        rag_chain.initialize(documents)
+        data_processor.mark_ingested(rag_chain.collection_name)
+        init_state.update(status="ready", ready_at=time.time())
+        print("RAG system initialized successfully!")
+    except Exception as e:
+        init_state.update(status="failed", error=str(e))
+        print(f"RAG system initialization failed: {str(e)}")
+
+def require_ready():
+    """Reject requests that need the RAG chain until initialization has finished"""
+    if init_state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"RAG system is {init_state['status']}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("Starting RAG system initialization...")
-    if not rag_chain.collection_exists():
-        documents = data_processor.process_documents()
-        rag_chain.initialize(documents)
-    else:
-        rag_chain.initialize(None)
-    print("RAG system initialized successfully!")
+    print("Starting RAG system initialization in the background...")
+    app.state.init_task = asyncio.create_task(asyncio.to_thread(initialize_rag))
     yield
     # Shutdown
-    if rag_chain.db:
+    if rag_chain and rag_chain.db and not rag_chain.read_only:
         rag_chain.db.persist()
     print("Shutting down...")
 
@@ -68,21 +122,126 @@ async def ui():
 # Define request model
 class Question(BaseModel):
     text: str
+    # Restrict retrieval to these guidelines (ACG, BSG, ESsCD, MED-FDA); by default
+    # guidelines named in the question are only boosted, never exclusive
+    sources: Optional[List[str]] = None
+
+def requested_sources(question: Question):
+    """Validated exclusive source filter from the request, or None to search every guideline"""
+    if not question.sources:
+        return None
+    try:
+        return validate_sources(question.sources)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/query")
 async def query_rag(question: Question):
     """Query the RAG system"""
+    require_ready()
+    sources = requested_sources(question)
     try:
-        response = rag_chain.query(question.text)
-        return {"answer": response}
+        response = await rag_chain.aquery(question.text, sources)
+        return {
+            "answer": response["answer"],
+            "cached": response["cached"],
+            "timings": response.get("timings", {}),
+            "context": response.get("context", {}),
+            "filters": response.get("filters", {})
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_rag_stream(question: Question):
+    """Stream the answer as newline-delimited JSON events (sources first, then tokens)"""
+    require_ready()
+    sources = requested_sources(question)
+
+    async def event_stream():
+        try:
+            async for event in rag_chain.astream_query(question.text, sources):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def query_rag_batch(request: Request, job_id: Optional[str] = None):
+    """Answer a JSONL question set, streaming one JSON result line per question as it completes.
+
+    Lines are {"question": ..., "id": optional, "sources": optional}. With
+    job_id, finished results are journaled and resubmitting the same job
+    replays them instead of asking the LLM again.
+    """
+    require_ready()
+    body = (await request.body()).decode("utf-8")
+    try:
+        items, duplicates = parse_batch(
+            body,
+            max_items=int(os.getenv("RAG_BATCH_MAX_ITEMS", "1000")),
+            detect=rag_chain.auto_source_filter
+        )
+        journal = BatchJournal.for_job(os.getenv("RAG_BATCH_JOB_DIR", "./batch_jobs"), job_id) if job_id else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def result_stream():
+        try:
+            async for record in run_batch(rag_chain, items, journal, duplicates):
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Answer cache hit-rate, request coalescing, upstream LLM call counts and model routing"""
+    if not rag_chain:
+        return {"enabled": False}
+    stats = {
+        "llm_calls": rag_chain.llm_calls,
+        "coalescing": rag_chain.single_flight.stats()
+    }
+    if rag_chain.model_router:
+        stats["model_router"] = rag_chain.model_router.stats()
+    if not rag_chain.answer_cache:
+        return {"enabled": False, **stats}
+    return {"enabled": True, **rag_chain.answer_cache.stats(), **stats}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus-style latency histograms and counters for the RAG pipeline"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness endpoint: 200 once the RAG chain can answer, 503 with progress until then"""
+    finished_at = init_state["ready_at"] or time.time()
+    body = {
+        "status": init_state["status"],
+        "elapsed_s": round(finished_at - init_state["started_at"], 2),
+        "progress": dict(rag_chain.progress) if rag_chain else {"stage": "importing"},
+        "snapshot": init_state["snapshot"],
+        "error": init_state["error"]
+    }
+    return JSONResponse(body, status_code=200 if init_state["status"] == "ready" else 503)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -90,4 +249,12 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    workers = int(os.getenv("RAG_WORKERS", "1"))
+    port = int(os.getenv("PORT", "8080"))
+    if workers > 1:
+        if not SNAPSHOT_DIR:
+            raise RuntimeError("RAG_WORKERS > 1 requires RAG_SNAPSHOT_DIR (build one with ingest.py)")
+        # Each worker process imports this module and opens the snapshot itself
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file